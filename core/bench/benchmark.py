@@ -0,0 +1,271 @@
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+from collections import OrderedDict
+from pyauto.core import api, taskapi, __version__
+from pyauto.util import yamlutil
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class Region(api.KindObject):
+    def login(self):
+        return self.tag
+
+
+class App(api.KindObject):
+    pass
+
+
+class RegionApp(api.KindObject):
+    def push_app(self):
+        return self.tag
+
+
+class File(api.KindObject):
+    def render_template(self):
+        return self.tag
+
+
+package_yaml = """
+package: bench
+version: 0.0.0
+kinds:
+  - kind: Region
+    configs: benchmark.Region
+    tasks:
+      - login
+  - kind: App
+    configs: benchmark.App
+    tasks: []
+  - kind: RegionApp
+    configs: benchmark.RegionApp
+    relations:
+      region: Region
+      app: App
+    tasks:
+      - push_app
+  - kind: File
+    configs: benchmark.File
+    attributes:
+      name: string
+    relations:
+      region_app: RegionApp optional
+    tasks:
+      - render_template
+"""
+
+packages = [yamlutil.load_dict(package_yaml)]
+
+sequences = """
+arguments:
+  region: {reg: bench.Region}
+  application:
+    reg: bench.Region
+    app: bench.App
+    __join__:
+      - {kind: bench.RegionApp, tag: '{reg}_{app}'}
+sequences:
+  region_login:
+    region:
+      - task: bench.Region.login {{reg.tag}}
+  render_template:
+    application:
+      - task: bench.File.render_template {{reg.tag}}_{{app.tag}}
+  push_app:
+    application:
+      - task: bench.RegionApp.push_app {{reg.tag}}_{{app.tag}}
+  deploy_app:
+    application:
+      - seq: region_login
+      - seq: render_template
+      - seq: push_app
+"""
+
+
+def get_labels(i):
+    return ['l{0}'.format(i % 10), 'even' if i % 2 == 0 else 'odd']
+
+
+def generate_objects(size):
+    regions = 10
+    apps = max(1, size // (2 * regions))
+    for r in range(regions):
+        yield OrderedDict([('kind', 'bench.Region'), ('tag', 'r{0}'.format(r)),
+                           ('labels', get_labels(r))])
+    for a in range(apps):
+        yield OrderedDict([('kind', 'bench.App'), ('tag', 'a{0}'.format(a)),
+                           ('labels', get_labels(a))])
+    count = regions + apps
+    for r in range(regions):
+        for a in range(apps):
+            tag = 'r{0}_a{1}'.format(r, a)
+            yield OrderedDict([
+                ('kind', 'bench.RegionApp'), ('tag', tag),
+                ('labels', get_labels(count)),
+                ('region', 'r{0}'.format(r)), ('app', 'a{0}'.format(a))])
+            count += 1
+            if count < size:
+                yield OrderedDict([
+                    ('kind', 'bench.File'), ('tag', tag),
+                    ('labels', get_labels(count)),
+                    ('name', '{0}.yml'.format(tag)), ('region_app', tag)])
+                count += 1
+    while count < size:
+        tag = 'f{0}'.format(count)
+        yield OrderedDict([
+            ('kind', 'bench.File'), ('tag', tag),
+            ('labels', get_labels(count)), ('name', tag)])
+        count += 1
+
+
+def write_objects(dirname, size, chunk=10000):
+    objects = list(generate_objects(size))
+    for i in range(0, len(objects), chunk):
+        filename = os.path.join(dirname, 'objects{0:05d}.yml'.format(i))
+        with open(filename, 'w') as f:
+            f.write(yamlutil.dump_dict(objects[i:i + chunk]))
+    return len(objects)
+
+
+def measure(func, repeat=1, memory=True):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.time()
+        func()
+        duration = time.time() - start
+        best = duration if best is None else min(best, duration)
+    result = OrderedDict([('seconds', best), ('peak_bytes', None)])
+    if memory and tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        func()
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def run(args):
+    dirname = tempfile.mkdtemp()
+    try:
+        count = write_objects(dirname, args.size)
+        tasks = taskapi.TaskSequences(yamlutil.load_dict(sequences))
+        state = {}
+
+        def load():
+            repo = api.Repository()
+            repo.load_packages(packages)
+            repo.load_file(dirname, jobs=args.jobs)
+            state['repo'] = repo
+
+        def query():
+            repo = state['repo']
+            repo.query({'bench.File': {'all': True}}, resolve=True)
+            repo.query({'bench.File': {'labels': ['l1', 'l2']}}, resolve=True)
+            repo.query({'bench.RegionApp': {'labels': {
+                'all': ['even'], 'not': ['l2']}}}, resolve=True)
+            repo.query({'bench.App': {'tags': [
+                'a{0}'.format(i) for i in range(100)]}}, resolve=True)
+
+        def resolve():
+            tasks.resolve(state['repo'], {}, 'deploy_app')
+
+        def invoke():
+            repo = state['repo']
+            for obj in repo['bench.File']:
+                repo.invoke('bench.File.render_template', obj.tag, {})
+
+        def dump():
+            list(state['repo'].dump())
+
+        results = OrderedDict()
+        for name, func in [('load_file', load), ('query', query),
+                           ('resolve', resolve), ('invoke', invoke),
+                           ('dump', dump)]:
+            results[name] = measure(func, args.repeat, args.memory)
+            sys.stderr.write('{0}: {1:.3f}s\n'.format(
+                name, results[name]['seconds']))
+        output = OrderedDict([
+            ('meta', OrderedDict([
+                ('size', count),
+                ('jobs', args.jobs),
+                ('repeat', args.repeat),
+                ('version', __version__),
+                ('python', platform.python_version()),
+                ('time', time.time()),
+            ])),
+            ('results', results),
+        ])
+        if args.output is None:
+            print(json.dumps(output, indent=2))
+        else:
+            with open(args.output, 'w') as f:
+                json.dump(output, f, indent=2)
+    finally:
+        shutil.rmtree(dirname)
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.results) as f:
+        results = json.load(f)
+    if baseline['meta']['size'] != results['meta']['size']:
+        sys.stderr.write('warning: sizes differ: {0} != {1}\n'.format(
+            baseline['meta']['size'], results['meta']['size']))
+    regressions = []
+    for name, new in results['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        for metric in ['seconds', 'peak_bytes']:
+            if not old.get(metric) or new.get(metric) is None:
+                continue
+            ratio = float(new[metric]) / old[metric]
+            flag = ratio > 1 + args.threshold
+            print('{0:10} {1:10} {2:>14.4g} {3:>14.4g} {4:>7.2f}x{5}'.format(
+                name, metric, old[metric], new[metric], ratio,
+                '  REGRESSION' if flag else ''))
+            if flag:
+                regressions.append((name, metric))
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    actions = parser.add_subparsers(dest='action')
+    run_parser = actions.add_parser('run')
+    run_parser.add_argument('-n', '--size', dest='size', type=int,
+                            default=10000)
+    run_parser.add_argument('-r', '--repeat', dest='repeat', type=int,
+                            default=3)
+    run_parser.add_argument('-j', '--jobs', dest='jobs', type=int)
+    run_parser.add_argument('-o', '--output', dest='output')
+    run_parser.add_argument('--no-memory', dest='memory',
+                            action='store_false')
+    compare_parser = actions.add_parser('compare')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('results')
+    compare_parser.add_argument('-t', '--threshold', dest='threshold',
+                                type=float, default=0.2)
+    args = parser.parse_args()
+    if 'run' == args.action:
+        run(args)
+    elif 'compare' == args.action:
+        sys.exit(compare(args))
+    else:
+        parser.print_help()
+
+
+if '__main__' == __name__:
+    main()
@@ -0,0 +1,132 @@
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from . import api, tracing
+from .executor import TaskGraph, get_error_object
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def get_running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def run_or_schedule(coro):
+    loop = get_running_loop()
+    if loop is None:
+        return run(coro)
+    return loop.create_task(coro)
+
+
+def consume(results, callback):
+    async def drain():
+        async for res in results:
+            callback(res)
+    run(drain())
+
+
+async def invoke(repo, taskref, tag, args, executor=None):
+    ref = api.TaskReference(taskref)
+    kt = repo[ref.kind].kind.tasks[ref.name]
+    if not kt.is_coroutine:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, functools.partial(repo.invoke, taskref, tag, args))
+    return await invoke_task(repo, kt, repo[ref.kind][tag], args)
+
+
+async def invoke_task(repo, kt, obj, args):
+    invocation = api.TaskInvocation(repo, kt, obj, args)
+    output = invocation.lookup()
+    if output is not None:
+        return output
+    start = time.time()
+    with tracing.detached_span('invoke', task=kt.name, obj=obj.ref):
+        res = await kt.call(obj, **invocation.args)
+    return invocation.finish(start, time.time() - start, res)
+
+
+async def invoke_many(repo, tasks, jobs=None):
+    jobs = jobs or 1
+    if jobs < 1:
+        raise api.PyautoException(
+            'ainvoke_many jobs must be at least 1: {0}'.format(jobs))
+    semaphore = asyncio.Semaphore(jobs)
+    with ThreadPoolExecutor(jobs) as executor:
+        async def invoke_one(taskref, tag, args):
+            async with semaphore:
+                return await invoke(repo, taskref, tag, args,
+                                    executor=executor)
+        return await asyncio.gather(*[
+            invoke_one(*task) for task in tasks])
+
+
+class AsyncExecutor(object):
+    def __init__(self, repo, jobs=1):
+        if jobs < 1:
+            raise api.PyautoException(
+                'AsyncExecutor jobs must be at least 1: {0}'.format(jobs))
+        self.repo = repo
+        self.jobs = jobs
+
+    async def run(self, steps):
+        graph = steps if isinstance(steps, TaskGraph) else TaskGraph(steps)
+        remaining = [len(deps) for deps in graph.dependencies]
+        semaphore = asyncio.Semaphore(self.jobs)
+        skipped = set()
+        pending = {}
+
+        with ThreadPoolExecutor(self.jobs) as executor:
+            async def run_step(step):
+                async with semaphore:
+                    return await invoke(
+                        self.repo, step.taskref, step.tag, step.args,
+                        executor=executor)
+
+            def schedule(i):
+                future = asyncio.ensure_future(run_step(graph.steps[i]))
+                pending[future] = (i, time.time())
+
+            for i in graph.roots():
+                schedule(i)
+            try:
+                while pending:
+                    done, _ = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        i, start = pending.pop(future)
+                        error = future.exception()
+                        if error is None:
+                            yield future.result()
+                            for j in graph.dependents[i]:
+                                remaining[j] -= 1
+                                if 0 == remaining[j] and j not in skipped:
+                                    schedule(j)
+                            continue
+                        yield get_error_object(
+                            graph.steps[i], str(error), start,
+                            time.time() - start)
+                        for j in graph.descendants(i):
+                            if j not in skipped:
+                                skipped.add(j)
+                                yield get_error_object(
+                                    graph.steps[j],
+                                    'skipped: dependency failed: {0}'
+                                    .format(graph.steps[i].command))
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+def run_steps(repo, steps, jobs=None):
+    return AsyncExecutor(repo, jobs or 1).run(steps)
+
+
+def run_sequence(sequences, repo, query, name, jobs=None):
+    return run_steps(repo, sequences.resolve_steps(repo, query, name), jobs)
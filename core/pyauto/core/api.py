@@ -4,20 +4,30 @@ import sys
 import six
 import time
 import json
+import hashlib
+import inspect
 import shlex
 import jinja2
 import logging
 import itertools
 import importlib
+import collections
+import multiprocessing
 from logging import StreamHandler
 from copy import deepcopy
 from pyauto.util import yamlutil
+from . import tracing
 from collections import OrderedDict
 
 
 logger = logging.getLogger('pyauto.core')
 
 
+def is_coroutine_function(func):
+    check = getattr(inspect, 'iscoroutinefunction', None)
+    return check is not None and check(func)
+
+
 def setup_logger(logger):
     formatter = logging.Formatter('%(message)s')
     handler = StreamHandler(sys.stdout)
@@ -27,104 +37,301 @@ def setup_logger(logger):
     logger.setLevel(logging.DEBUG)
 
 
-def read_packages(filename, neighbor=None):
-
-    def _read_packages(filename):
-        if os.path.isfile(filename):
-            with open(filename) as f:
-                for item in yamlutil.load_dict(f, load_all=True):
-                    if isinstance(item, list):
-                        for obj in item:
-                            yield obj
-                    else:
-                        yield item
-        elif os.path.isdir(filename):
-            for dirpath, dirnames, filenames in os.walk(filename):
-                for filename in filenames:
-                    filename = os.path.join(dirpath, filename)
-                    with open(filename) as f:
-                        for item in yamlutil.load_dict(f, load_all=True):
-                            if isinstance(item, list):
-                                for obj in item:
-                                    yield obj
-                            else:
-                                yield item
-        else:
-            raise PyautoException('Not a file or directory: {0}'
-                                  .format(filename))
+def _read_file(filename):
+    with open(filename) as f:
+        for item in yamlutil.load_dict(f, load_all=True):
+            if isinstance(item, list):
+                for obj in item:
+                    yield obj
+            else:
+                yield item
+
+
+def _load_file(filename):
+    return list(_read_file(filename))
+
+
+def _trace_file(filename):
+    with tracing.span('load_yaml', filename=filename):
+        return _load_file(filename)
 
+
+def iter_files(filename):
+    if os.path.isdir(filename):
+        for dirpath, dirnames, filenames in os.walk(filename):
+            dirnames.sort()
+            for name in sorted(filenames):
+                yield os.path.join(dirpath, name)
+    else:
+        yield filename
+
+
+def iter_documents(filename, neighbor=None, jobs=None):
     if neighbor is not None:
         filename = os.path.join(
             os.path.dirname(os.path.abspath(filename)), neighbor)
 
-    return list(_read_packages(filename))
+    read_file = _read_file if tracing.tracer is None else _trace_file
+    if os.path.isfile(filename):
+        for obj in read_file(filename):
+            yield filename, obj
+    elif os.path.isdir(filename):
+        filenames = list(iter_files(filename))
+        if jobs is not None and jobs > 1 and len(filenames) > 1:
+            pool = multiprocessing.Pool(jobs)
+            try:
+                results = pool.imap(_load_file, filenames)
+                for name, objs in zip(filenames, results):
+                    for obj in objs:
+                        yield name, obj
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for name in filenames:
+                for obj in read_file(name):
+                    yield name, obj
+    else:
+        raise PyautoException('Not a file or directory: {0}'
+                              .format(filename))
+
+
+def iter_packages(filename, neighbor=None, jobs=None):
+    for _, obj in iter_documents(filename, neighbor, jobs):
+        yield obj
+
+
+def read_packages(filename, neighbor=None, jobs=None):
+    return list(iter_packages(filename, neighbor, jobs))
 
 
 def get_output_object(
-        task=None, obj=None, time=None, duration=None, result=None):
+        task=None, obj=None, time=None, duration=None, result=None,
+        skipped=None, batch=None):
     if not isinstance(result, (dict, OrderedDict, list, int, float)) and \
             not isinstance(result, six.string_types):
         result = str(result)
-    return OrderedDict([
+    output = OrderedDict([
         ('task', task.name),
         ('obj', obj.ref),
         ('time', time),
         ('duration', duration),
         ('result', result),
     ])
+    if skipped is not None:
+        output['skipped'] = skipped
+    if batch is not None:
+        output['batch'] = batch
+    return output
+
+
+class TaskInvocation(object):
+    def __init__(self, repo, task, obj, args):
+        self.repo = repo
+        self.task = task
+        self.obj = obj
+        self.args = args or {}
+        self.key = repo.get_result_key(task, obj, self.args)
+        self.check = repo.get_up_to_date_check(task, obj, self.args)
+
+    def lookup(self):
+        if self.key is not None:
+            output = self.repo.result_cache.get(self.key)
+            if output is not None:
+                output['cached'] = True
+                return output
+        if self.check is not None and self.check.is_up_to_date():
+            return get_output_object(
+                task=self.task,
+                obj=self.obj,
+                time=time.time(),
+                duration=0,
+                result=self.check.result,
+                skipped='up-to-date',
+            )
+        return None
+
+    def finish(self, start, duration, result, batch=None):
+        output = get_output_object(
+            task=self.task,
+            obj=self.obj,
+            time=start,
+            duration=duration,
+            result=result,
+            batch=batch,
+        )
+        if self.check is not None:
+            self.check.save(output)
+        if self.key is not None:
+            self.repo.result_cache.put(self.key, output)
+        return output
 
 
 class Repository(object):
     def __init__(self):
         self._data = OrderedDict()
         self._packages = OrderedDict()
+        self._sources = OrderedDict()
+        self._object_sources = dict()
+        self._dependents = dict()
+        self._generation = 0
+        self._result_cache = None
+        self._fingerprints = None
 
     @property
     def data(self):
         return self._data
 
+    @property
+    def generation(self):
+        return self._generation
+
+    def touch(self):
+        self._generation += 1
+        return self
+
     @property
     def kinds(self):
         return [k.kind for k in self._data.values()]
 
     def query(self, q, **options):
         result = OrderedDict()
-        for kindstr, objs in q.items():
-            result[kindstr] = self.get(kindstr).query(objs, **options)
-            if options.get('resolve', False):
-                result[kindstr] = [i for i in result[kindstr]]
+        with tracing.span('query', kinds=list(q)):
+            for kindstr, objs in q.items():
+                result[kindstr] = self.get(kindstr).query(objs, **options)
+                if options.get('resolve', False):
+                    result[kindstr] = [i for i in result[kindstr]]
         return result
 
     def invoke(self, taskref, tag, args):
-        args = args or {}
         ref = TaskReference(taskref)
         obj = self[ref.kind][tag]
         kt = self[ref.kind].kind.tasks[ref.name]
+        return self.invoke_task(kt, obj, args)
+
+    def invoke_task(self, kt, obj, args):
+        if kt.is_coroutine:
+            from . import aio
+            if aio.get_running_loop() is not None:
+                return aio.run_or_schedule(
+                    aio.invoke_task(self, kt, obj, args))
+        invocation = TaskInvocation(self, kt, obj, args)
+        output = invocation.lookup()
+        if output is not None:
+            return output
         start = time.time()
-        res = kt.invoke(obj, **args)
-        duration = time.time() - start
-        return get_output_object(
-            task=kt,
-            obj=obj,
-            time=start,
-            duration=duration,
-            result=res,
-        )
+        res = kt.invoke(obj, **invocation.args)
+        return invocation.finish(start, time.time() - start, res)
+
+    def get_task(self, taskref):
+        ref = TaskReference(taskref)
+        return self[ref.kind].kind.tasks[ref.name]
+
+    def invoke_many(self, tasks):
+        calls = []
+        groups = OrderedDict()
+        for i, (taskref, tag, args) in enumerate(tasks):
+            ref = TaskReference(taskref)
+            kt = self.get_task(taskref)
+            calls.append((kt, self[ref.kind][tag], args))
+            if kt.batchable:
+                key = (kt, json.dumps(args or {}, sort_keys=True,
+                                      default=str))
+            else:
+                key = i
+            groups.setdefault(key, []).append(i)
+        outputs = [None] * len(calls)
+        for indexes in groups.values():
+            pending = []
+            for i in indexes:
+                invocation = TaskInvocation(self, *calls[i])
+                outputs[i] = invocation.lookup()
+                if outputs[i] is None:
+                    pending.append((i, invocation))
+            if not pending:
+                continue
+            kt = pending[0][1].task
+            group = [invocation for _, invocation in pending]
+            for (i, _), output in zip(pending, self.invoke_group(kt, group)):
+                outputs[i] = output
+        return outputs
+
+    def invoke_group(self, kt, invocations):
+        if kt.is_coroutine:
+            from . import aio
+            if aio.get_running_loop() is not None:
+                raise InvalidKindObjectTaskInvocationException(
+                    'Coroutine task {0} cannot be invoked in groups inside a '
+                    'running event loop, use ainvoke_many'.format(kt.name))
+        if not kt.batchable:
+            outputs = []
+            for invocation in invocations:
+                start = time.time()
+                res = kt.invoke(invocation.obj, **invocation.args)
+                outputs.append(invocation.finish(
+                    start, time.time() - start, res))
+            return outputs
+        objs = [invocation.obj for invocation in invocations]
+        start = time.time()
+        results = kt.invoke_batch(objs, **invocations[0].args)
+        duration = (time.time() - start) / len(objs)
+        return [invocation.finish(start, duration, res, batch=len(objs))
+                for invocation, res in zip(invocations, results)]
+
+    @property
+    def result_cache(self):
+        return self._result_cache
+
+    def set_result_cache(self, cache):
+        self._result_cache = cache
+        return self
+
+    def get_result_key(self, kt, obj, args):
+        if self._result_cache is None or not kt.cacheable:
+            return None
+        return self._result_cache.key(kt.name, obj.ref, self.digest(obj), args)
+
+    @property
+    def fingerprints(self):
+        return self._fingerprints
+
+    def set_fingerprints(self, store):
+        self._fingerprints = store
+        return self
+
+    def get_up_to_date_check(self, kt, obj, args):
+        if self._fingerprints is None:
+            return None
+        return self._fingerprints.check(self, kt, obj, args)
+
+    def digest(self, obj):
+        digest = hashlib.sha1()
+        seen = set()
+        stack = [obj]
+        while stack:
+            obj = stack.pop()
+            if obj.ref in seen:
+                continue
+            seen.add(obj.ref)
+            digest.update(json.dumps([obj.ref, obj.data], sort_keys=True,
+                                     default=str).encode('utf-8'))
+            for _, ref in self._iter_relation_refs(obj):
+                if ref in self:
+                    stack.append(self[ref])
+        return digest.hexdigest()
+
+    def ainvoke(self, taskref, tag, args, executor=None):
+        from . import aio
+        return aio.invoke(self, taskref, tag, args, executor=executor)
+
+    def ainvoke_many(self, tasks, jobs=None):
+        from . import aio
+        return aio.invoke_many(self, tasks, jobs=jobs)
 
     def invoke_kind_task(self, kind, tag, task, args):
-        args = args or {}
         obj = self[kind][tag]
         kt = self[kind].kind.tasks[task]
-        start = time.time()
-        res = kt.invoke(obj, **args)
-        duration = time.time() - start
-        return get_output_object(
-            task=kt,
-            obj=obj,
-            time=start,
-            duration=duration,
-            result=res,
-        )
+        return self.invoke_task(kt, obj, args)
 
     def dump(self):
         for obj in self:
@@ -202,6 +409,7 @@ class Repository(object):
             self._packages[package.name] = package
             for kind in package.kinds:
                 self._add_kind(kind)
+            self.touch()
 
     def get_package(self, package):
         self.assert_package(package)
@@ -212,32 +420,190 @@ class Repository(object):
         return self._data[str(kind)].kind
 
     def add(self, obj):
-        if not isinstance(obj, (dict, OrderedDict)) or 'kind' not in obj:
+        if isinstance(obj, KindObject):
+            kind_name = obj.kind.name
+        elif not isinstance(obj, (dict, OrderedDict)) or 'kind' not in obj:
             raise InvalidKindObjectException('Invalid kind object: {0}'
                                              .format(obj))
-        kind_name = obj['kind']
+        else:
+            kind_name = obj['kind']
         self.assert_kind(kind_name)
-        return self._data[kind_name].add(obj)
+        obj = self._data[kind_name].add(obj)
+        self._index_relations(obj)
+        self.touch()
+        return obj
 
     def load_packages_file(self, filename, neighbor=None):
         pkgs = read_packages(filename, neighbor)
         return self.load_packages(pkgs)
 
-    def load_file(self, filename, neighbor=None):
-        objs = read_packages(filename, neighbor)
-        return self.load_objects(objs)
+    def load_file(self, filename, neighbor=None, progress=None, jobs=None):
+        with tracing.span('load_file', filename=filename):
+            docs = iter_documents(filename, neighbor, jobs)
+            for count, (path, obj) in enumerate(docs, 1):
+                self._add_source(path, self.add(obj))
+                if progress is not None:
+                    progress(count)
+        return self
+
+    @property
+    def sources(self):
+        return self._sources
+
+    def get_source(self, obj):
+        return self._object_sources.get(obj.ref)
+
+    def _add_source(self, path, obj):
+        path = os.path.abspath(path)
+        if path not in self._sources:
+            self._sources[path] = OrderedDict()
+        self._sources[path][obj.ref] = None
+        self._object_sources[obj.ref] = path
+
+    def _remove_source(self, obj):
+        path = self._object_sources.pop(obj.ref, None)
+        if path is not None:
+            refs = self._sources[path]
+            refs.pop(obj.ref, None)
+            if not refs:
+                del self._sources[path]
+
+    def reload(self, paths):
+        if isinstance(paths, six.string_types):
+            paths = [paths]
+        paths = [os.path.abspath(path) for path in paths]
+        documents = OrderedDict()
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            for data in _read_file(path):
+                if not isinstance(data, (dict, OrderedDict)) or \
+                        'kind' not in data or 'tag' not in data:
+                    raise InvalidKindObjectException(
+                        'Invalid kind object: {0}'.format(data))
+                self.assert_kind(data['kind'])
+                ref = '/'.join([data['kind'], data['tag']])
+                if ref in documents:
+                    raise DuplicateKindObjectException(kind_tag=ref)
+                obj = self._data[data['kind']].kind.object_class(self, data)
+                if not isinstance(obj.labels, list) or not all(
+                        isinstance(label, six.string_types)
+                        for label in obj.labels):
+                    raise InvalidKindObjectException(
+                        'Invalid kind object labels: {0}'.format(ref))
+                documents[ref] = (path, obj)
+        removed = [ref for path in paths
+                   for ref in self._sources.get(path, [])
+                   if ref not in documents]
+        added, updated, moved = [], [], []
+        for ref, (path, obj) in documents.items():
+            if ref not in self:
+                added.append(ref)
+                continue
+            source = self._object_sources.get(ref)
+            if source != path:
+                if source is None or source not in paths and \
+                        os.path.exists(source):
+                    raise DuplicateKindObjectException(kind_tag=ref)
+                moved.append(ref)
+            if self.get(ref).data != obj.data:
+                updated.append(ref)
+        for ref in removed:
+            self.remove(self.get(ref))
+        for ref in updated:
+            self.replace(self.get(ref), documents[ref][1])
+        for ref in moved:
+            self._remove_source(self.get(ref))
+            self._add_source(documents[ref][0], self.get(ref))
+        for ref in added:
+            path, obj = documents[ref]
+            self._add_source(path, self.add(obj))
+        return OrderedDict([('added', added), ('removed', removed),
+                            ('updated', updated), ('moved', moved)])
 
     def remove_package(self, pkg):
         self.assert_package(pkg.name)
         pkg = self._packages[pkg.name]
         for kind in pkg.kinds:
-            for obj in self[kind.name]:
+            for obj in list(self[kind.name]):
                 self.remove(obj)
         del self._packages[pkg.name]
+        self.touch()
 
     def remove(self, obj):
         self.assert_kind(obj.kind.name)
+        if self._is_indexed(obj):
+            self._unindex_relations(obj)
         self._data[obj.kind.name].remove(obj)
+        self._remove_source(obj)
+        self.touch()
+
+    def replace(self, obj, data):
+        self.assert_kind(obj.kind.name)
+        self._unindex_relations(self.get(obj.ref))
+        obj = self._data[obj.kind.name].replace(obj, data)
+        self._index_relations(obj)
+        self.touch()
+        return obj
+
+    def set_relation(self, obj, name, value):
+        indexed = self._is_indexed(obj)
+        if indexed:
+            self._unindex_relations(obj)
+        obj._data[name] = value
+        if indexed:
+            self._index_relations(obj)
+        self.touch()
+
+    def dependents(self, ref, transitive=False):
+        if isinstance(ref, KindObject):
+            ref = ref.ref
+        result = OrderedDict()
+        queue = collections.deque([ref])
+        while queue:
+            for source, _ in self._dependents.get(queue.popleft(), ()):
+                if source != ref and source not in result:
+                    result[source] = None
+                    if transitive:
+                        queue.append(source)
+        return list(result)
+
+    def impact(self, ref):
+        ref = self.get(ref).ref
+        return OrderedDict([
+            ('ref', ref),
+            ('direct', self.dependents(ref)),
+            ('transitive', self.dependents(ref, transitive=True)),
+        ])
+
+    def _is_indexed(self, obj):
+        objs = self._data.get(obj.kind.name)
+        return objs is not None and obj.tag in objs and \
+            objs[obj.tag] is obj
+
+    def _iter_relation_refs(self, obj):
+        for name, relation in obj.kind.relations.items():
+            value = obj.data.get(name)
+            if value is None:
+                continue
+            elif not isinstance(value, list):
+                value = [value]
+            for tag in value:
+                yield name, '{0}/{1}'.format(relation.kind, tag)
+
+    def _index_relations(self, obj):
+        for name, ref in self._iter_relation_refs(obj):
+            if ref not in self._dependents:
+                self._dependents[ref] = OrderedDict()
+            self._dependents[ref][(obj.ref, name)] = None
+
+    def _unindex_relations(self, obj):
+        for name, ref in self._iter_relation_refs(obj):
+            sources = self._dependents.get(ref)
+            if sources is not None:
+                sources.pop((obj.ref, name), None)
+                if not sources:
+                    del self._dependents[ref]
 
     def load_packages(self, data):
         for package in data:
@@ -254,11 +620,15 @@ class Repository(object):
 
     def parse_objects(self, data):
         data = yamlutil.load_dict(data, load_all=True)
-        return self.load_objects(data)
-
-    def load_objects(self, data):
-        for obj in data:
-            self.add(deepcopy(obj))
+        return self.load_objects(data, copy=False)
+
+    def load_objects(self, data, copy=True, progress=None):
+        for count, obj in enumerate(data, 1):
+            if copy:
+                obj = deepcopy(obj)
+            self.add(obj)
+            if progress is not None:
+                progress(count)
         return self
 
 
@@ -355,6 +725,7 @@ class AttributeDetail(object):
     kind = None
     name = None
     required = True
+    cacheable = True
 
     def __init__(self, kind, name, key):
         self._parse = []
@@ -366,6 +737,8 @@ class AttributeDetail(object):
                 self._parse.append(self.resolve_parser(part))
             elif 'optional' == part:
                 self.required = False
+            elif 'nocache' == part:
+                self.cacheable = False
             else:
                 self._parse.append(self.resolve_parser(part))
 
@@ -383,6 +756,13 @@ class AttributeDetail(object):
         return value
 
     def get_attribute(self, obj):
+        if tracing.tracer is not None:
+            with tracing.tracer.span('parse_attribute', kind=self.kind.name,
+                                     name=self.name):
+                return self._get_attribute(obj)
+        return self._get_attribute(obj)
+
+    def _get_attribute(self, obj):
         if self.name not in obj:
             if self.required:
                 raise KindObjectAttributeException(
@@ -393,6 +773,11 @@ class AttributeDetail(object):
         value = obj[self.name]
         return self.parse(value)
 
+    def compile(self):
+        if 1 == len(self._parse):
+            return self._parse[0]
+        return self.parse
+
 
 class Package(object):
     def __init__(self, repo, package):
@@ -466,17 +851,21 @@ class Kind(object):
                     'Kind relations may not have the sam e as attributes: {0}'
                     .format(name))
         self._tasks = KindTasks(self, kind.get('tasks', []))
+        self._cache = kind.get('cache', True)
+        self._slots = kind.get('slots', False)
+        self._object_class = None
 
     def dump(self, obj):
+        data = obj.data
         res = OrderedDict([
             ('kind', obj.kind.name),
             ('tag', obj.tag),
             ('labels', obj.labels)
         ])
         for name in self.attributes:
-            res[name] = obj.data.get(name)
+            res[name] = data.get(name)
         for name in self.relations:
-            res[name] = obj.data.get(name)
+            res[name] = data.get(name)
         return res
 
     @property
@@ -528,6 +917,14 @@ class Kind(object):
                 'Unknown attribute relation: {0} for {1}'.format(name, obj))
         return self._relations[name].get_attribute(obj, repo)
 
+    def is_cacheable(self, name):
+        if not self._cache:
+            return False
+        elif name in self._attributes:
+            return self._attributes[name].cacheable
+        else:
+            return name in self._relations
+
     def resolve_attr(self, name, obj, repo):
         if name in self._attributes:
             return self._resolve_attribute(name, obj)
@@ -564,6 +961,38 @@ class Kind(object):
     def get_module(self):
         return self._get_config_class()
 
+    @property
+    def object_class(self):
+        if not self._slots:
+            return self.config_class
+        if self._object_class is None:
+            self._object_class = self._build_object_class()
+        return self._object_class
+
+    def _build_object_class(self):
+        base = self.config_class
+        names = ['kind', 'tag', 'labels']
+        for name in itertools.chain(self._attributes, self._relations):
+            if name not in names:
+                names.append(name)
+        slots = ['_field{0}'.format(i) for i in range(len(names))]
+        cls = type(base.__name__, (base,), {
+            '__slots__': tuple(slots) + ('_extra',),
+            '__module__': base.__module__,
+            '_data': property(KindObjectFields, _set_fields),
+            'data': property(_get_fields),
+        })
+        cls._fields = OrderedDict([
+            (name, cls.__dict__[slot]) for name, slot in zip(names, slots)])
+        for name, attr in self._attributes.items():
+            if not hasattr(base, name):
+                setattr(cls, name, _attribute_property(
+                    attr, cls._fields[name], self.is_cacheable(name)))
+        for name in self._relations:
+            if not hasattr(base, name):
+                setattr(cls, name, _relation_property(name))
+        return cls
+
 
 class KindTasks(object):
     def __init__(self, kind, tasks):
@@ -578,6 +1007,14 @@ class KindTasks(object):
                         'Module task not found: {0} for class {1}'.format(
                             task, self._command_class))
                 self._tasks[task] = KindTask(self, self._command_class, task)
+            elif isinstance(task, (dict, OrderedDict)) and len(task) == 1:
+                name, options = next(iter(task.items()))
+                if not hasattr(self._command_class, name):
+                    raise UnknownKindObjectTaskException(
+                        'Module task not found: {0} for class {1}'.format(
+                            name, self._command_class))
+                self._tasks[name] = KindTask(
+                    self, self._command_class, name, options)
             else:
                 raise InvalidKindObjectTaskException(
                     'Invalid task spec: {0}'.format(task))
@@ -620,15 +1057,52 @@ class KindTasks(object):
 
 
 class KindTask(object):
-    def __init__(self, tasks, module, task):
+    valid_options = ['cache', 'inputs', 'outputs', 'state']
+    batch_suffix = '__batch'
+
+    def __init__(self, tasks, module, task, options=None):
+        options = options or {}
+        if not isinstance(options, (dict, OrderedDict)):
+            raise InvalidKindObjectTaskException(
+                'Invalid task options: {0}'.format(options))
+        for key in options:
+            if key not in self.valid_options:
+                raise InvalidKindObjectTaskException(
+                    'Invalid task option: {0}'.format(key))
+        for key in ['inputs', 'outputs', 'state']:
+            paths = options.get(key, [])
+            if not isinstance(paths, list) or not all(
+                    isinstance(p, six.string_types) for p in paths):
+                raise InvalidKindObjectTaskException(
+                    'Task option "{0}" must be a list of strings: {1}'
+                    .format(key, paths))
         self._tasks = tasks
         self._module = module
         self._task = task
+        self._options = options
+        self._coroutine = is_coroutine_function(getattr(module, task, None))
+        self._batch = getattr(module, task + self.batch_suffix, None)
 
     @property
     def name(self):
         return ''.join([self._tasks.kind.name, '.', self._task])
 
+    @property
+    def is_coroutine(self):
+        return self._coroutine
+
+    @property
+    def batchable(self):
+        return self._batch is not None
+
+    @property
+    def options(self):
+        return self._options
+
+    @property
+    def cacheable(self):
+        return bool(self._options.get('cache', False))
+
     @property
     def module_name(self):
         return ''.join([self._module.__name__, '.', self._task])
@@ -637,12 +1111,48 @@ class KindTask(object):
     def tasks(self):
         return self._tasks
 
-    def invoke(self, obj, **args):
-        if type(obj) == self._module:
+    def call(self, obj, **args):
+        if isinstance(obj, self._module):
             return getattr(obj, self._task)(**args)
         else:
             return getattr(self._module, self._task)(obj, **args)
 
+    def invoke(self, obj, **args):
+        if tracing.tracer is not None:
+            with tracing.tracer.span('invoke', task=self.name, obj=obj.ref):
+                return self._invoke(obj, **args)
+        return self._invoke(obj, **args)
+
+    def _invoke(self, obj, **args):
+        res = self.call(obj, **args)
+        if self._coroutine:
+            from . import aio
+            res = aio.run_or_schedule(res)
+        return res
+
+    def invoke_batch(self, objs, **args):
+        if not self.batchable:
+            raise UnknownKindObjectTaskException(
+                'Batch task not found: {0}{1}'.format(
+                    self.name, self.batch_suffix))
+        if tracing.tracer is not None:
+            with tracing.tracer.span('invoke_batch', task=self.name,
+                                     size=len(objs)):
+                return self._invoke_batch(objs, **args)
+        return self._invoke_batch(objs, **args)
+
+    def _invoke_batch(self, objs, **args):
+        results = self._batch(list(objs), **args)
+        if is_coroutine_function(self._batch):
+            from . import aio
+            results = aio.run(results)
+        results = list(results)
+        if len(results) != len(objs):
+            raise InvalidKindObjectTaskInvocationException(
+                'Batch task {0} returned {1} results for {2} objects'
+                .format(self.name, len(results), len(objs)))
+        return results
+
     def __call__(self, obj, **args):
         return self.invoke(obj, **args)
 
@@ -658,6 +1168,8 @@ class KindObjects(object):
         self._kind = kind
         self._items = OrderedDict()
         self._labels = OrderedDict()
+        self._order = dict()
+        self._count = 0
 
     @property
     def data(self):
@@ -678,33 +1190,82 @@ class KindObjects(object):
         labels = data.get('labels', [])
         if isinstance(labels, six.text_type):
             labels = [labels]
-        elif not isinstance(labels, list):
-            raise InvalidQueryException('Query labels must be a list')
+        elif not isinstance(labels, (list, dict, OrderedDict)):
+            raise InvalidQueryException(
+                'Query labels must be a list or a selector')
 
         seen = set()
         for result in self.query_tags(tags, **options):
             if result not in seen:
                 seen.add(result)
                 yield result
-        for result in self.query_labels(labels, **options):
+        if isinstance(labels, list):
+            results = self.query_labels(labels, **options)
+        else:
+            results = self.query_selector(labels, **options)
+        for result in results:
             if result not in seen:
                 seen.add(result)
                 yield result
 
     def query_tags(self, tags, **options):
-        for obj in self._items.values():
-            if obj.tag in tags:
-                yield self.get_object(obj, **options)
+        found = set()
+        for tag in tags:
+            try:
+                if tag in self._items:
+                    found.add(tag)
+            except TypeError:
+                raise InvalidQueryException(
+                    'Query tag is invalid: {0!r}'.format(tag))
+        for tag in sorted(found, key=self._order.__getitem__):
+            yield self.get_object(self._items[tag], **options)
 
     def query_labels(self, labels, **options):
         if len(labels) != len(set(labels)):
             raise InvalidQueryException('query_label requires a unique list')
+        for tag in self._iter_label_tags(labels):
+            yield self.get_object(self._items[tag], **options)
+
+    def query_selector(self, selector, **options):
+        for key in selector:
+            if key not in ('any', 'all', 'not'):
+                raise InvalidQueryException(
+                    'Unknown label selector: {0}'.format(key))
+        any_ = self._get_selector_labels(selector, 'any')
+        all_ = self._get_selector_labels(selector, 'all')
+        not_ = self._get_selector_labels(selector, 'not')
+        if any_:
+            candidates = self._iter_label_tags(any_)
+        elif all_:
+            smallest = min(all_, key=lambda l: len(self._labels.get(l, ())))
+            candidates = iter(self._labels.get(smallest, ()))
+        elif not_:
+            candidates = iter(self._items)
+        else:
+            return
+        required = [self._labels.get(label, ()) for label in all_]
+        excluded = [self._labels.get(label, ()) for label in not_]
+        for tag in candidates:
+            if all(tag in tags for tags in required) and \
+                    not any(tag in tags for tags in excluded):
+                yield self.get_object(self._items[tag], **options)
+
+    def _get_selector_labels(self, selector, key):
+        labels = selector.get(key, [])
+        if isinstance(labels, six.text_type):
+            labels = [labels]
+        elif not isinstance(labels, list):
+            raise InvalidQueryException(
+                'Query label selector "{0}" must be a list'.format(key))
+        return labels
+
+    def _iter_label_tags(self, labels):
         seen = set()
         for label in labels:
-            for tag in self._labels.get(label, []):
+            for tag in self._labels.get(label, ()):
                 if tag not in seen:
                     seen.add(tag)
-                    yield self.get_object(self[tag], **options)
+                    yield tag
 
     def get_object(self, obj, **options):
         if options.get('ref'):
@@ -724,22 +1285,42 @@ class KindObjects(object):
 
     def add(self, obj):
         if not isinstance(obj, KindObject):
-            obj = self.kind.config_class(self._repo, obj)
+            obj = self.kind.object_class(self._repo, obj)
         if obj.tag in self._items:
             raise DuplicateKindObjectException(kind_tag=obj.ref)
         self._items[obj.tag] = obj
+        self._order[obj.tag] = self._count
+        self._count += 1
         for label in obj.labels:
             self._add_label(label, obj.tag)
         return obj
 
+    def replace(self, obj, data):
+        self.assert_object(obj.tag)
+        if not isinstance(data, KindObject):
+            data = self.kind.object_class(self._repo, data)
+        if data.tag != obj.tag:
+            raise InvalidKindObjectException(
+                'Replacement object tag does not match: {0}'.format(data.ref))
+        current = self._items[obj.tag]
+        for label in current.labels:
+            self._remove_label(label, current.tag)
+        self._items[data.tag] = data
+        for label in data.labels:
+            self._add_label(label, data.tag)
+        return data
+
     def _add_label(self, label, tag):
         if label not in self._labels:
-            self._labels[label] = list()
-        self._labels[label].append(tag)
+            self._labels[label] = OrderedDict()
+        self._labels[label][tag] = None
 
     def _remove_label(self, label, tag):
         if label in self._labels:
-            self._labels[label].remove(tag)
+            tags = self._labels[label]
+            tags.pop(tag, None)
+            if not tags:
+                del self._labels[label]
             return True
         return False
 
@@ -748,6 +1329,7 @@ class KindObjects(object):
             for label in obj.labels:
                 self._remove_label(label, obj.tag)
             del self._items[obj.tag]
+            del self._order[obj.tag]
             return True
         return False
 
@@ -770,10 +1352,14 @@ class KindObjects(object):
 
 
 class KindObject(object):
+    __slots__ = ('_repo', '_kind', '_data', '_cache', '_generation')
+
     def __init__(self, repo, obj):
         self._repo = repo
         self._kind = repo.get_kind(obj['kind'])
         self._data = obj
+        self._cache = None
+        self._generation = None
 
     @property
     def ref(self):
@@ -797,19 +1383,41 @@ class KindObject(object):
 
     def set_repo(self, repo):
         self._repo = repo
+        self.invalidate()
         return self
 
+    def invalidate(self):
+        self._cache = None
+        return self
+
+    def _get_cache(self):
+        generation = self._repo.generation
+        if self._cache is None or self._generation != generation:
+            self._cache = {}
+            self._generation = generation
+        return self._cache
+
     def get(self, name):
-        return self._kind.resolve_attr(name, self._data, self._repo)
+        if not self._kind.is_cacheable(name):
+            return self._kind.resolve_attr(name, self._data, self._repo)
+        cache = self._get_cache()
+        if name not in cache:
+            cache[name] = self._kind.resolve_attr(
+                name, self._data, self._repo)
+        return cache[name]
 
     def set(self, item, value):
-        self._data[item] = value
+        if item in self._kind.relations:
+            self._repo.set_relation(self, item, value)
+        else:
+            self._data[item] = value
+        self.invalidate()
 
     def dump(self):
         return self.kind.dump(self)
 
     def __repr__(self):
-        return json.dumps({self.ref: self._data})
+        return json.dumps({self.ref: self.data})
 
     def __getattr__(self, item):
         return self.get(item)
@@ -828,6 +1436,112 @@ class KindObject(object):
             yield (name, self.get(name))
 
 
+class KindObjectFields(object):
+    __slots__ = ('_obj',)
+
+    def __init__(self, obj):
+        self._obj = obj
+
+    def __getitem__(self, name):
+        obj = self._obj
+        field = obj._fields.get(name)
+        if field is None:
+            if obj._extra is None:
+                raise KeyError(name)
+            return obj._extra[name]
+        try:
+            return field.__get__(obj, type(obj))
+        except AttributeError:
+            raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        obj = self._obj
+        field = obj._fields.get(name)
+        if field is not None:
+            field.__set__(obj, value)
+        elif obj._extra is None:
+            obj._extra = OrderedDict([(name, value)])
+        else:
+            obj._extra[name] = value
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        obj = self._obj
+        for name, field in obj._fields.items():
+            try:
+                field.__get__(obj, type(obj))
+            except AttributeError:
+                continue
+            yield name
+        if obj._extra is not None:
+            for name in obj._extra:
+                yield name
+
+    def items(self):
+        for name in self.keys():
+            yield name, self[name]
+
+    def __iter__(self):
+        return self.keys()
+
+
+def _get_fields(obj):
+    return OrderedDict(obj._data.items())
+
+
+def _set_fields(obj, data):
+    for field in obj._fields.values():
+        try:
+            field.__delete__(obj)
+        except AttributeError:
+            pass
+    obj._extra = None
+    fields = obj._data
+    for name, value in data.items():
+        fields[name] = value
+
+
+def _attribute_property(attr, field, cacheable):
+    name = attr.name
+    parse = attr.compile()
+
+    def fget(obj):
+        if tracing.tracer is not None:
+            return obj.get(name)
+        if cacheable:
+            cache = obj._get_cache()
+            if name in cache:
+                return cache[name]
+        try:
+            value = field.__get__(obj, type(obj))
+        except AttributeError:
+            value = attr.get_attribute(obj._data)
+        else:
+            value = parse(value)
+        if cacheable:
+            cache[name] = value
+        return value
+    return property(fget)
+
+
+def _relation_property(name):
+    def fget(obj):
+        return obj.get(name)
+    return property(fget)
+
+
 class RelationList(object):
     def __init__(self, parent, name, items):
         self._parent = parent
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import signal
+import socket
+from six.moves import socketserver
+from collections import OrderedDict
+from . import api, tracing
+
+
+actions = ['run', 'resolve', 'query', 'impact', 'dump', 'invoke',
+           'history']
+path_options = ['output', 'plan']
+server_options = OrderedDict([
+    ('snapshot', '--snapshot'),
+    ('cache', '--cache'),
+    ('up_to_date', '--up-to-date'),
+    ('history', '--history'),
+    ('trace', '--trace'),
+])
+
+
+class DaemonException(api.PyautoException):
+    pass
+
+
+class Watcher(object):
+    def __init__(self, *filenames):
+        self.filenames = [fn for fn in filenames if fn is not None]
+        self.stats = self.pending = self.scan()
+
+    def scan(self):
+        stats = OrderedDict()
+        for filename in self.filenames:
+            for fn in api.iter_files(filename):
+                try:
+                    stat = os.stat(fn)
+                except OSError:
+                    continue
+                stats[os.path.abspath(fn)] = (stat.st_mtime, stat.st_size)
+        return stats
+
+    def poll(self):
+        stats = self.pending = self.scan()
+        return sorted([path for path in set(stats) | set(self.stats)
+                       if stats.get(path) != self.stats.get(path)])
+
+    def commit(self):
+        self.stats = self.pending
+
+
+class MessageStream(object):
+    def __init__(self, f):
+        self.f = f
+
+    def send(self, **message):
+        self.f.write((json.dumps(message) + '\n').encode('utf-8'))
+        self.f.flush()
+
+    def write(self, text):
+        if text:
+            self.send(output=text)
+
+    def flush(self):
+        self.f.flush()
+
+
+class Daemon(object):
+    def __init__(self, command, parser, dispatch):
+        self.command = command
+        self.parser = parser
+        self.dispatch = dispatch
+        self.packages = Watcher(command.packages_filename)
+        self.objects = Watcher(command.objects_filename)
+        self.tasks = Watcher(command.tasks_filename)
+
+    @property
+    def files(self):
+        return [self.command.packages_filename,
+                self.command.objects_filename,
+                self.command.tasks_filename]
+
+    def refresh(self):
+        packages = self.packages.poll()
+        objects = self.objects.poll()
+        tasks = self.tasks.poll()
+        if packages or (objects and self.command.snapshot is not None):
+            self.reload()
+            for watcher in [self.packages, self.objects, self.tasks]:
+                watcher.commit()
+            return
+        if objects:
+            with tracing.span('reload', files=len(objects)):
+                self.command.repository.reload(objects)
+            self.objects.commit()
+        if tasks:
+            self.command.read_tasks()
+            self.tasks.commit()
+
+    def reload(self):
+        old, sequences = self.command.repository, self.command.sequences
+        repo = api.Repository()
+        repo.set_result_cache(old.result_cache)
+        repo.set_fingerprints(old.fingerprints)
+        self.command.repository = repo
+        try:
+            with tracing.span('load'):
+                self.command.load()
+        except Exception:
+            self.command.repository = old
+            self.command.sequences = sequences
+            raise
+
+    def parse(self, request):
+        files = request.get('files')
+        if files is not None and files != self.files:
+            raise DaemonException(
+                'Daemon is serving other files: {0}'.format(self.files))
+        try:
+            args = self.parser.parse_args(request['argv'])
+        except SystemExit:
+            raise DaemonException(
+                'Invalid arguments: {0}'.format(request['argv']))
+        if args.action not in actions:
+            raise DaemonException(
+                'Unsupported daemon action: {0}'.format(args.action))
+        for name, option in server_options.items():
+            if getattr(args, name, None) not in (None, False):
+                raise DaemonException(
+                    '{0} applies to the daemon, pass it to serve instead'
+                    .format(option))
+        cwd = request.get('cwd')
+        if cwd is not None:
+            for name in path_options:
+                value = getattr(args, name, None)
+                if value is not None:
+                    setattr(args, name, os.path.join(cwd, value))
+        return args
+
+    def handle(self, request, stream):
+        args = self.parse(request)
+        self.refresh()
+        self.command.output_stream = stream
+        try:
+            with tracing.span('request', action=args.action):
+                self.dispatch(self.command, args)
+        finally:
+            self.command.output_stream = None
+            if self.command.history is not None:
+                self.command.history.flush()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        stream = MessageStream(self.wfile)
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            self.server.daemon.handle(request, stream)
+        except Exception as e:
+            api.logger.exception(e)
+            stream.send(status=1, error=str(e) or e.__class__.__name__)
+        else:
+            stream.send(status=0)
+
+
+class Server(socketserver.UnixStreamServer):
+    def __init__(self, filename, daemon):
+        self.daemon = daemon
+        socketserver.UnixStreamServer.__init__(self, filename, RequestHandler)
+
+
+def is_listening(filename):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(filename)
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+def serve(daemon, filename):
+    dirname = os.path.dirname(filename)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    if os.path.exists(filename):
+        if is_listening(filename):
+            raise DaemonException(
+                'Daemon is already listening on {0}'.format(filename))
+        os.unlink(filename)
+    server = Server(filename, daemon)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    api.logger.info('listening on {0}'.format(filename))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(filename)
+
+
+def request(filename, data, write):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(filename)
+        except socket.error as e:
+            raise DaemonException(
+                'Daemon is not listening on {0}: {1}'.format(filename, e))
+        f = sock.makefile('rwb')
+        f.write((json.dumps(data) + '\n').encode('utf-8'))
+        f.flush()
+        for line in f:
+            message = json.loads(line.decode('utf-8'))
+            if 'output' in message:
+                write(message['output'])
+            elif message.get('status'):
+                raise DaemonException(message.get('error'))
+            else:
+                return
+        raise DaemonException('Daemon closed the connection')
+    finally:
+        sock.close()
@@ -0,0 +1,190 @@
+import json
+import time
+from six.moves import queue
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from . import api
+
+
+def get_error_object(step, error, start=None, duration=None):
+    kind = step.taskref.rsplit('.', 1)[0]
+    return OrderedDict([
+        ('task', step.taskref),
+        ('obj', '/'.join([kind, step.tag])),
+        ('time', start),
+        ('duration', duration),
+        ('result', None),
+        ('error', error),
+    ])
+
+
+class TaskGraph(object):
+    def __init__(self, steps):
+        self.steps = list(steps)
+        self.dependencies = [set() for _ in self.steps]
+        self.dependents = [[] for _ in self.steps]
+        self._build()
+
+    def _build(self):
+        latest = OrderedDict()
+        index = {}
+        for i, step in enumerate(self.steps):
+            context = dict(step.context)
+            names = frozenset(context)
+            for varset, keys in latest.items():
+                shared = varset & names
+                key = tuple(sorted((n, context[n]) for n in shared))
+                if shared == varset:
+                    if key in keys:
+                        self.add_edge(keys[key], i)
+                    continue
+                projections = index[varset].get(shared)
+                if projections is None:
+                    projections = index[varset][shared] = {}
+                    for other, j in keys.items():
+                        self._project(projections, shared, other, j)
+                for j in projections.get(key, {}).values():
+                    self.add_edge(j, i)
+            key = tuple(sorted(context.items()))
+            if names not in latest:
+                latest[names] = OrderedDict()
+                index[names] = {}
+            latest[names][key] = i
+            for shared, projections in index[names].items():
+                self._project(projections, shared, key, i)
+
+    def _project(self, projections, shared, key, i):
+        projection = tuple(item for item in key if item[0] in shared)
+        if projection not in projections:
+            projections[projection] = OrderedDict()
+        projections[projection][key] = i
+
+    def add_edge(self, i, j):
+        if i not in self.dependencies[j]:
+            self.dependencies[j].add(i)
+            self.dependents[i].append(j)
+
+    def roots(self):
+        return [i for i, deps in enumerate(self.dependencies) if not deps]
+
+    def descendants(self, i):
+        seen = OrderedDict()
+        stack = list(self.dependents[i])
+        while stack:
+            j = stack.pop()
+            if j not in seen:
+                seen[j] = None
+                stack.extend(self.dependents[j])
+        return list(seen)
+
+    def __len__(self):
+        return len(self.steps)
+
+
+class Executor(object):
+    def __init__(self, repo, jobs=1):
+        if jobs < 1:
+            raise api.PyautoException(
+                'Executor jobs must be at least 1: {0}'.format(jobs))
+        self.repo = repo
+        self.jobs = jobs
+
+    def invoke(self, step):
+        return self.repo.invoke(step.taskref, step.tag, step.args)
+
+    def run(self, steps):
+        graph = steps if isinstance(steps, TaskGraph) else TaskGraph(steps)
+        completed = queue.Queue()
+        remaining = [len(deps) for deps in graph.dependencies]
+        skipped = set()
+        pool = ThreadPool(self.jobs)
+
+        def run_step(i):
+            start = time.time()
+            try:
+                completed.put((i, self.invoke(graph.steps[i]), None))
+            except Exception as e:
+                completed.put((i, None, get_error_object(
+                    graph.steps[i], str(e), start, time.time() - start)))
+
+        pending = 0
+        try:
+            for i in graph.roots():
+                pool.apply_async(run_step, (i,))
+                pending += 1
+            while pending:
+                i, output, error = completed.get()
+                pending -= 1
+                if error is None:
+                    yield output
+                    for j in graph.dependents[i]:
+                        remaining[j] -= 1
+                        if 0 == remaining[j] and j not in skipped:
+                            pool.apply_async(run_step, (j,))
+                            pending += 1
+                    continue
+                yield error
+                for j in graph.descendants(i):
+                    if j not in skipped:
+                        skipped.add(j)
+                        yield get_error_object(
+                            graph.steps[j], 'skipped: dependency failed: {0}'
+                            .format(graph.steps[i].command))
+        finally:
+            pool.close()
+            pool.join()
+
+
+class BatchExecutor(object):
+    def __init__(self, repo):
+        self.repo = repo
+
+    def get_groups(self, graph, ready):
+        groups = OrderedDict()
+        for i in ready:
+            step = graph.steps[i]
+            if self.repo.get_task(step.taskref).batchable:
+                key = (step.taskref, json.dumps(
+                    step.args, sort_keys=True, default=str))
+            else:
+                key = i
+            groups.setdefault(key, []).append(i)
+        return list(groups.values())
+
+    def invoke(self, graph, group):
+        start = time.time()
+        try:
+            return list(zip(group, self.repo.invoke_many([
+                (graph.steps[i].taskref, graph.steps[i].tag,
+                 graph.steps[i].args) for i in group])))
+        except Exception as e:
+            return [(i, get_error_object(
+                graph.steps[i], str(e), start, time.time() - start))
+                for i in group]
+
+    def run(self, steps):
+        graph = steps if isinstance(steps, TaskGraph) else TaskGraph(steps)
+        remaining = [len(deps) for deps in graph.dependencies]
+        skipped = set()
+        ready = graph.roots()
+        while ready:
+            completed = []
+            for group in self.get_groups(graph, ready):
+                for i, output in self.invoke(graph, group):
+                    yield output
+                    if 'error' not in output:
+                        completed.append(i)
+                        continue
+                    for j in graph.descendants(i):
+                        if j not in skipped:
+                            skipped.add(j)
+                            yield get_error_object(
+                                graph.steps[j],
+                                'skipped: dependency failed: {0}'
+                                .format(graph.steps[i].command))
+            ready = []
+            for i in completed:
+                for j in graph.dependents[i]:
+                    remaining[j] -= 1
+                    if 0 == remaining[j] and j not in skipped:
+                        ready.append(j)
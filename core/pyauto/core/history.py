@@ -0,0 +1,125 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+from . import api, sqlitedb
+
+
+def get_status(output):
+    if 'error' in output:
+        return 'error'
+    elif output.get('cached'):
+        return 'cached'
+    elif 'skipped' in output:
+        return 'skipped'
+    return 'ok'
+
+
+def percentile_offset(count, p):
+    return max(0, int(math.ceil(p / 100.0 * count)) - 1)
+
+
+class History(sqlitedb.Store):
+    schema = [
+        'CREATE TABLE IF NOT EXISTS runs ('
+        'id INTEGER PRIMARY KEY, task TEXT, kind TEXT, '
+        'ref TEXT, time REAL, duration REAL, status TEXT)',
+    ] + ['CREATE INDEX IF NOT EXISTS runs_{0} ON runs ({0})'.format(column)
+         for column in ['task', 'kind', 'ref', 'time']]
+
+    def __init__(self, filename, batch_size=1000):
+        super(History, self).__init__(filename)
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def add(self, output):
+        kind = output['obj'].split('/', 1)[0]
+        row = (output['task'], kind, output['obj'],
+               output.get('time') or time.time(), output.get('duration'),
+               get_status(output))
+        with self._lock:
+            self._pending.append(row)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+        return output
+
+    def flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if rows:
+            conn = self.connect()
+            conn.executemany('INSERT INTO runs (task, kind, ref, time, '
+                             'duration, status) VALUES (?, ?, ?, ?, ?, ?)',
+                             rows)
+            conn.commit()
+
+    def get_filter(self, since=None, task=None, status='ok', timed=True):
+        clauses = ['duration IS NOT NULL'] if timed else ['1']
+        params = []
+        if status is not None:
+            clauses.append('status = ?')
+            params.append(status)
+        if since is not None:
+            clauses.append('time >= ?')
+            params.append(since)
+        if task is not None:
+            clauses.append('task = ?')
+            params.append(task)
+        return ' AND '.join(clauses), params
+
+    def stats(self, group='task', since=None, task=None):
+        if group not in ('task', 'kind'):
+            raise api.PyautoException(
+                'Invalid history group: {0}'.format(group))
+        conn = self.connect()
+        where, params = self.get_filter(since, task, 'error', timed=False)
+        errors = dict(conn.execute(
+            'SELECT {0}, COUNT(*) FROM runs WHERE {1} GROUP BY {0}'
+            .format(group, where), params))
+        where, params = self.get_filter(since, task)
+        rows = conn.execute(
+            'SELECT {0}, COUNT(*), AVG(duration), MAX(duration) FROM runs '
+            'WHERE {1} GROUP BY {0} ORDER BY {0}'.format(group, where),
+            params).fetchall()
+        for name, count, mean, longest in rows:
+            yield OrderedDict([
+                (group, name),
+                ('count', count),
+                ('errors', errors.get(name, 0)),
+                ('mean', mean),
+                ('p50', self.percentile(group, name, where, params, count,
+                                        50)),
+                ('p95', self.percentile(group, name, where, params, count,
+                                        95)),
+                ('max', longest),
+            ])
+
+    def percentile(self, group, name, where, params, count, p):
+        return self.connect().execute(
+            'SELECT duration FROM runs WHERE {0} AND {1} = ? '
+            'ORDER BY duration LIMIT 1 OFFSET ?'.format(where, group),
+            params + [name, percentile_offset(count, p)]).fetchone()[0]
+
+    def slowest(self, limit=10, since=None, task=None):
+        where, params = self.get_filter(since, task)
+        rows = self.connect().execute(
+            'SELECT task, ref, COUNT(*), AVG(duration), MAX(duration), '
+            'MAX(time) FROM runs WHERE {0} GROUP BY task, ref '
+            'ORDER BY AVG(duration) DESC LIMIT ?'.format(where),
+            params + [limit])
+        for task, ref, count, mean, longest, last in rows:
+            yield OrderedDict([
+                ('task', task),
+                ('obj', ref),
+                ('count', count),
+                ('mean', mean),
+                ('max', longest),
+                ('last', last),
+            ])
+
+    def __len__(self):
+        self.flush()
+        return self.connect().execute(
+            'SELECT COUNT(*) FROM runs').fetchone()[0]
@@ -0,0 +1,157 @@
+import re
+import sys
+import six
+import json
+import time
+from collections import OrderedDict
+from pyauto.util import yamlutil
+from . import api
+
+
+formats = ['yaml', 'json', 'jsonl', 'prettyjson']
+plain_re = re.compile(r'^[A-Za-z_/][A-Za-z0-9_ ./@-]*$')
+reserved_words = set([
+    'y', 'Y', 'yes', 'Yes', 'YES', 'n', 'N', 'no', 'No', 'NO',
+    'true', 'True', 'TRUE', 'false', 'False', 'FALSE',
+    'on', 'On', 'ON', 'off', 'Off', 'OFF', 'null', 'Null', 'NULL'])
+mapping_types = (dict, OrderedDict)
+
+
+class UnsupportedValue(Exception):
+    pass
+
+
+def render_scalar(value):
+    if value is None:
+        return 'null'
+    elif isinstance(value, bool):
+        return 'true' if value else 'false'
+    elif isinstance(value, six.integer_types):
+        return str(value)
+    elif isinstance(value, float):
+        text = repr(value)
+        if '.' not in text or 'n' in text:
+            raise UnsupportedValue(value)
+        return text
+    elif isinstance(value, six.string_types):
+        if plain_re.match(value) and value not in reserved_words and \
+                value == value.rstrip():
+            return value
+        return json.dumps(value)
+    raise UnsupportedValue(value)
+
+
+def render_block(value, indent, lines):
+    if isinstance(value, mapping_types):
+        for key, item in value.items():
+            if not isinstance(key, six.string_types):
+                raise UnsupportedValue(key)
+            key = indent + render_scalar(key) + ':'
+            if isinstance(item, mapping_types) and item:
+                lines.append(key)
+                render_block(item, indent + '  ', lines)
+            elif isinstance(item, list) and item:
+                lines.append(key)
+                render_block(item, indent, lines)
+            else:
+                lines.append(key + ' ' + render_flow(item))
+    else:
+        for item in value:
+            if isinstance(item, (list,) + mapping_types) and item:
+                start = len(lines)
+                render_block(item, indent + '  ', lines)
+                lines[start] = indent + '- ' + lines[start][len(indent) + 2:]
+            else:
+                lines.append(indent + '- ' + render_flow(item))
+
+
+def render_flow(value):
+    if isinstance(value, mapping_types):
+        if value:
+            raise UnsupportedValue(value)
+        return '{}'
+    elif isinstance(value, list):
+        if value:
+            raise UnsupportedValue(value)
+        return '[]'
+    return render_scalar(value)
+
+
+def render_yaml(item):
+    try:
+        if not isinstance(item, (list,) + mapping_types) or not item:
+            raise UnsupportedValue(item)
+        lines = ['---']
+        render_block(item, '', lines)
+        lines.append('')
+        return '\n'.join(lines)
+    except UnsupportedValue:
+        return yamlutil.dump_dict(item, explicit_start=True)
+
+
+def render_documents(format, items):
+    if 'yaml' == format:
+        return ''.join([render_yaml(item) for item in items])
+    elif format in ('json', 'jsonl'):
+        return ''.join([json.dumps(item) + '\n' for item in items])
+    elif 'prettyjson' == format:
+        return ''.join([json.dumps(item, indent=2) + '\n' for item in items])
+    elif 'text' == format:
+        return ''.join([str(item) + '\n' for item in items])
+    else:
+        raise api.PyautoException('Invalid output format: {0}'.format(format))
+
+
+class OutputWriter(object):
+    def __init__(self, stream, format='yaml', batch_size=1000, interval=1.0,
+                 close=False):
+        if format not in formats and 'text' != format:
+            raise api.PyautoException(
+                'Invalid output format: {0}'.format(format))
+        self.stream = stream
+        self.format = format
+        self.batch_size = batch_size
+        self.interval = interval
+        self._close = close
+        self._batch = []
+        self._flushed = time.time()
+
+    def write(self, data):
+        self._batch.append(data)
+        if len(self._batch) >= self.batch_size or \
+                time.time() - self._flushed >= self.interval:
+            self.flush()
+
+    def write_text(self, text):
+        self._write_batch()
+        self.stream.write(text)
+        if not text.endswith('\n'):
+            self.stream.write('\n')
+
+    def _write_batch(self):
+        if self._batch:
+            self.stream.write(render_documents(self.format, self._batch))
+            self._batch = []
+
+    def flush(self):
+        self._write_batch()
+        self.stream.flush()
+        self._flushed = time.time()
+
+    def close(self):
+        self.flush()
+        if self._close:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def open_output(filename=None, format='yaml', **options):
+    if filename is None or '-' == filename:
+        return OutputWriter(sys.stdout, format, **options)
+    return OutputWriter(open(filename, 'w'), format, close=True, **options)
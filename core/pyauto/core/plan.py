@@ -0,0 +1,124 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from . import api, taskapi, snapshot
+from .executor import TaskGraph
+
+
+version = 1
+
+
+def fingerprint(*filenames):
+    records = []
+    for i, filename in enumerate(filenames):
+        if filename is None:
+            continue
+        parent = os.path.dirname(os.path.abspath(filename))
+        for fn in api.iter_files(filename):
+            name = os.path.relpath(os.path.abspath(fn), parent)
+            records.append([i, name, snapshot.fingerprint_file(fn)[3]])
+    return hashlib.sha1(json.dumps(records).encode('utf-8')).hexdigest()
+
+
+def dump_step(step):
+    return OrderedDict([
+        ('command', step.command),
+        ('context', [list(item) for item in step.context]),
+        ('taskref', step.taskref),
+        ('tag', step.tag),
+        ('args', step.args),
+    ])
+
+
+def load_step(data):
+    return taskapi.TaskStep(
+        data['command'],
+        tuple(tuple(item) for item in data['context']),
+        data['taskref'],
+        data['tag'],
+        data['args'],
+    )
+
+
+def write_plan(f, steps, fingerprint, **header):
+    header = OrderedDict([
+        ('version', version),
+        ('fingerprint', fingerprint),
+    ] + sorted(header.items()))
+    f.write(json.dumps(header) + '\n')
+    count = 0
+    for step in steps:
+        f.write(json.dumps(dump_step(step)) + '\n')
+        count += 1
+    return count
+
+
+def read_plan(f, fingerprint=None):
+    lines = iter(f)
+    try:
+        header = json.loads(next(lines), object_pairs_hook=OrderedDict)
+    except (StopIteration, ValueError):
+        raise InvalidPlanException('plan header is missing or invalid')
+    if header.get('version') != version:
+        raise InvalidPlanException(
+            'unsupported plan version: {0}'.format(header.get('version')))
+    if fingerprint is not None and header.get('fingerprint') != fingerprint:
+        raise StalePlanException(
+            'plan was resolved from different files, resolve it again')
+    steps = []
+    for line in lines:
+        if line.strip():
+            steps.append(load_step(
+                json.loads(line, object_pairs_hook=OrderedDict)))
+    return header, steps
+
+
+def parse_shard(shard):
+    try:
+        index, count = [int(part) for part in shard.split('/')]
+    except ValueError:
+        raise InvalidPlanException(
+            'shard must look like i/n: {0}'.format(shard))
+    if count < 1 or not 1 <= index <= count:
+        raise InvalidPlanException(
+            'shard must be between 1/n and n/n: {0}'.format(shard))
+    return index, count
+
+
+def get_components(graph):
+    parent = list(range(len(graph)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for j, deps in enumerate(graph.dependencies):
+        for i in deps:
+            parent[find(i)] = find(j)
+    components = OrderedDict()
+    for i in range(len(graph)):
+        components.setdefault(find(i), []).append(i)
+    return list(components.values())
+
+
+def shard_steps(steps, index, count):
+    graph = steps if isinstance(steps, TaskGraph) else TaskGraph(steps)
+    sizes = [0] * count
+    selected = []
+    for component in sorted(get_components(graph), key=len, reverse=True):
+        shard = sizes.index(min(sizes))
+        sizes[shard] += len(component)
+        if shard == index - 1:
+            selected.extend(component)
+    return [graph.steps[i] for i in sorted(selected)]
+
+
+class InvalidPlanException(api.PyautoException):
+    pass
+
+
+class StalePlanException(InvalidPlanException):
+    pass
@@ -0,0 +1,59 @@
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+from . import api, sqlitedb
+
+
+class ResultCache(sqlitedb.Store):
+    schema = [
+        'CREATE TABLE IF NOT EXISTS results ('
+        'key TEXT PRIMARY KEY, value BLOB, used REAL)',
+        'CREATE INDEX IF NOT EXISTS results_used ON results (used)',
+    ]
+
+    def __init__(self, filename, size=1024):
+        super(ResultCache, self).__init__(filename)
+        self.size = size
+
+    def key(self, task, ref, digest, args):
+        return hashlib.sha1(json.dumps(
+            [task, ref, digest, args], sort_keys=True, default=str)
+            .encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        conn = self.connect()
+        row = conn.execute('SELECT value FROM results WHERE key = ?',
+                           (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute('UPDATE results SET used = ? WHERE key = ?',
+                     (time.time(), key))
+        conn.commit()
+        return pickle.loads(bytes(row[0]))
+
+    def put(self, key, value):
+        try:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            api.logger.warning('Not caching {0}, its output cannot be '
+                               'pickled: {1}'.format(key, e))
+            return value
+        conn = self.connect()
+        conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?)', (
+            key, sqlite3.Binary(data), time.time()))
+        conn.execute('DELETE FROM results WHERE key NOT IN ('
+                     'SELECT key FROM results ORDER BY used DESC LIMIT ?)',
+                     (self.size,))
+        conn.commit()
+        return value
+
+    def clear(self):
+        conn = self.connect()
+        conn.execute('DELETE FROM results')
+        conn.commit()
+
+    def __len__(self):
+        return self.connect().execute(
+            'SELECT COUNT(*) FROM results').fetchone()[0]
@@ -0,0 +1,59 @@
+import os
+import pickle
+import hashlib
+from .api import iter_files
+
+
+def fingerprint_file(filename):
+    stat = os.stat(filename)
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return (os.path.abspath(filename), stat.st_mtime, stat.st_size,
+            digest.hexdigest())
+
+
+def fingerprint(*filenames):
+    return [fingerprint_file(fn)
+            for filename in filenames if filename is not None
+            for fn in iter_files(filename)]
+
+
+class Snapshot(object):
+    version = 1
+
+    def __init__(self, filename):
+        self.filename = os.path.abspath(filename)
+
+    def load(self, key):
+        try:
+            with open(self.filename, 'rb') as f:
+                data = pickle.load(f)
+        except Exception:
+            return None
+        if not isinstance(data, dict) or \
+                data.get('version') != self.version or \
+                data.get('key') != key:
+            return None
+        return data.get('value')
+
+    def save(self, key, value):
+        dirname = os.path.dirname(self.filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({
+                'version': self.version,
+                'key': key,
+                'value': value,
+            }, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, self.filename)
+        return value
+
+    def get(self, key, build):
+        value = self.load(key)
+        if value is None:
+            value = self.save(key, build())
+        return value
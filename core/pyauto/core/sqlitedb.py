@@ -0,0 +1,24 @@
+import os
+import sqlite3
+import threading
+
+
+class Store(object):
+    schema = []
+
+    def __init__(self, filename):
+        self.filename = os.path.abspath(filename)
+        self._local = threading.local()
+
+    def connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            dirname = os.path.dirname(self.filename)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            conn = sqlite3.connect(self.filename, timeout=30)
+            for statement in self.schema:
+                conn.execute(statement)
+            conn.commit()
+            self._local.conn = conn
+        return conn
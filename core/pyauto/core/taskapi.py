@@ -1,8 +1,11 @@
+import re
 import itertools
 import shlex
 import six
 import json
-from . import api
+from copy import copy
+from . import api, tracing
+from collections import namedtuple
 from jinja2 import Template
 from pyauto.util import yamlutil
 from collections import OrderedDict
@@ -13,17 +16,71 @@ dict_types = (dict, OrderedDict)
 text_types = (six.text_type, six.binary_type)
 
 
+TaskStep = namedtuple('TaskStep', ['command', 'context', 'taskref', 'tag',
+                                   'args'])
+shell_chars = ('"', "'", '\\')
+template_chars = ('{{', '}}', '{%', '%}', '{#', '#}')
+
+
+def get_context_key(context):
+    return tuple(sorted(
+        (name, getattr(value, 'ref', value))
+        for name, value in context.items()))
+
+
+def get_task_step(cmd, context=()):
+    return TaskStep(cmd, context, *parse_task(cmd))
+
+
+def iter_unique_commands(commands):
+    seen = set()
+    for subtask, command, context in commands:
+        if command not in seen:
+            seen.add(command)
+            yield subtask, command, context
+
+
+def run_steps(repo, steps, jobs=None, batch=False):
+    if batch:
+        from .executor import BatchExecutor
+        for res in BatchExecutor(repo).run(steps):
+            yield res
+        return
+    if jobs is not None:
+        from .executor import Executor
+        for res in Executor(repo, jobs).run(steps):
+            yield res
+        return
+    for step in steps:
+        yield repo.invoke(step.taskref, step.tag, step.args)
+
+
+def split_task(cmd):
+    if any(c in cmd for c in shell_chars):
+        return shlex.split(cmd)
+    return cmd.split()
+
+
 def parse_task(cmd):
-    cmd = shlex.split(cmd)
+    cmd = split_task(cmd)
     if len(cmd) == 3:
-        return cmd[0], cmd[1], yamlutil.load_dict(cmd[2])
+        return cmd[0], cmd[1], parse_task_args(cmd[2])
     elif len(cmd) == 2:
         return cmd[0], cmd[1], {}
     else:
         raise InvalidTaskSequence('task is invalid: {0}'.format(cmd))
 
 
+def parse_task_args(args):
+    try:
+        return json.loads(args, object_pairs_hook=OrderedDict)
+    except ValueError:
+        return yamlutil.load_dict(args)
+
+
 class TaskSequenceArguments(object):
+    join_key = '__join__'
+
     def __init__(self, name, spec):
         if not isinstance(name, text_types):
             raise InvalidTaskSequence(
@@ -31,9 +88,21 @@ class TaskSequenceArguments(object):
         if not isinstance(spec, dict_types):
             raise InvalidTaskSequence(
                 'task sequence arguments must be a dict')
+        joins = spec.get(self.join_key, [])
+        if not isinstance(joins, list):
+            raise InvalidTaskSequence(
+                'task sequence arguments "{0}" joins must be a list'
+                .format(name))
         self.name = name
-        self.spec = spec
-        self.kinds = list(spec.values())
+        self.spec = OrderedDict([
+            (key, kind) for key, kind in spec.items()
+            if key != self.join_key])
+        self.kinds = list(self.spec.values())
+        self.joins = [get_join(self, join) for join in joins]
+
+    @property
+    def join_kinds(self):
+        return [join.kind for join in self.joins if join.kind is not None]
 
     def is_compatible(self, kinds):
         for kind in kinds:
@@ -51,10 +120,151 @@ class TaskSequenceArguments(object):
                 .format(self.name, name))
 
     def build_context(self, query_results):
+        names = list(self.spec.keys())
         parts = [query_results.get(kind, []) for kind in self.kinds]
-        for obj in itertools.product(*parts):
-            obj = {n: v for n, v in zip(list(self.spec.keys()), list(obj))}
-            yield obj
+        if not self.joins:
+            for obj in itertools.product(*parts):
+                yield {n: v for n, v in zip(names, obj)}
+            return
+        tags = [OrderedDict((get_tag(v), v) for v in part) for part in parts]
+        positions = [dict((t, i) for i, t in enumerate(part))
+                     for part in tags]
+        index = [[] for _ in names]
+        for join in self.joins:
+            index[join.last].append((join, join.build(
+                query_results, dict(zip(names, tags)))))
+        for obj in self._join(names, tags, positions, index, []):
+            yield {n: v for n, v in zip(names, obj)}
+
+    def _join(self, names, tags, positions, index, context):
+        i = len(context)
+        if i == len(names):
+            yield tuple(context)
+            return
+        candidates = None
+        for join, probe in index[i]:
+            key = tuple(get_tag(context[names.index(name)])
+                        for name in join.variables[:-1])
+            candidates = probe(key, tags[i] if candidates is None
+                               else candidates)
+        if candidates is None:
+            values = list(tags[i].values())
+        else:
+            values = [tags[i][t] for t in sorted(
+                candidates, key=positions[i].get)]
+        for value in values:
+            context.append(value)
+            for obj in self._join(names, tags, positions, index, context):
+                yield obj
+            context.pop()
+
+
+def get_tag(obj):
+    return getattr(obj, 'tag', obj)
+
+
+def get_join(arguments, join):
+    if not isinstance(join, dict_types):
+        raise InvalidTaskSequence('task sequence join must be a dict')
+    if 'relation' in join:
+        return RelationJoin(arguments, join)
+    elif 'tag' in join:
+        return TagJoin(arguments, join)
+    raise InvalidTaskSequence(
+        'task sequence join must set "relation" or "tag": {0}'.format(join))
+
+
+class TaskSequenceJoin(object):
+    kind = None
+
+    def __init__(self, arguments, variables):
+        names = list(arguments.spec.keys())
+        for name in variables:
+            arguments.assert_variable(name)
+        self.variables = sorted(set(variables), key=names.index)
+        self.last = names.index(self.variables[-1])
+
+    def iter_rows(self, query_results, tags):
+        return iter(())
+
+    def build(self, query_results, tags):
+        index = dict()
+        for row in self.iter_rows(query_results, tags):
+            key = tuple(row[name] for name in self.variables[:-1])
+            if key not in index:
+                index[key] = set()
+            index[key].add(row[self.variables[-1]])
+
+        def probe(key, candidates):
+            return set(t for t in index.get(key, ()) if t in candidates)
+        return probe
+
+
+class RelationJoin(TaskSequenceJoin):
+    def __init__(self, arguments, join):
+        parts = join['relation'].split('.')
+        if len(parts) != 2 or 'to' not in join:
+            raise InvalidTaskSequence(
+                'task sequence relation join must look like '
+                '{{relation: var.relation, to: var}}: {0}'.format(join))
+        self.source, self.relation = parts
+        self.target = join['to']
+        super(RelationJoin, self).__init__(
+            arguments, [self.source, self.target])
+
+    def iter_rows(self, query_results, tags):
+        targets = tags[self.target]
+        for tag, obj in tags[self.source].items():
+            value = obj.data.get(self.relation)
+            if value is None:
+                continue
+            elif not isinstance(value, list):
+                value = [value]
+            for target in value:
+                if target in targets:
+                    yield {self.source: tag, self.target: target}
+
+
+class TagJoin(TaskSequenceJoin):
+    pattern_re = re.compile(r'\{(\w+)\}')
+
+    def __init__(self, arguments, join):
+        if 'kind' not in join:
+            raise InvalidTaskSequence(
+                'task sequence tag join must set a kind: {0}'.format(join))
+        self.kind = join['kind']
+        self.pattern = join['tag']
+        self.parts = self.pattern_re.split(self.pattern)
+        super(TagJoin, self).__init__(arguments, self.parts[1::2])
+
+    def split(self, tag, tags, i=0, pos=0, values=None):
+        values = dict() if values is None else values
+        if i == len(self.parts):
+            if pos == len(tag):
+                yield dict(values)
+            return
+        part = self.parts[i]
+        if i % 2 == 0 or part in values:
+            value = part if i % 2 == 0 else values[part]
+            if tag.startswith(value, pos):
+                for row in self.split(tag, tags, i + 1, pos + len(value),
+                                      values):
+                    yield row
+            return
+        for end in range(pos, len(tag) + 1):
+            if tag[pos:end] not in tags[part]:
+                continue
+            values[part] = tag[pos:end]
+            for row in self.split(tag, tags, i + 1, end, values):
+                yield row
+            del values[part]
+
+    def iter_rows(self, query_results, tags):
+        for obj in query_results.get(self.kind, []):
+            tag = get_tag(obj)
+            if isinstance(tag, six.string_types):
+                for row in self.split(tag, tags):
+                    yield row
 
 
 class TaskSequenceQuery(object):
@@ -69,6 +279,9 @@ class TaskSequenceQuery(object):
             (kind, self.get_variable(varname))
             for varname, kind in self.sequence.arguments.spec.items()
         ])
+        for kind in self.sequence.get_join_kinds():
+            if kind not in self.query_args:
+                self.query_args[kind] = {'all': True}
 
     def get_variable(self, varname):
         value = self.query.get(varname, {'all': True})
@@ -112,32 +325,55 @@ class TaskSequences(object):
                 'unknown task sequence: {0}'.format(name))
         return self.sequences[name]
 
-    def resolve_context(self, repo, query, name):
+    def query_sequence(self, repo, query, name):
         sequence = self.get_sequence(name)
         query = TaskSequenceQuery(sequence, query)
-        query_results = repo.query(query.query_args, resolve=True)
+        return sequence, repo.query(query.query_args, resolve=True)
+
+    def resolve_context(self, repo, query, name):
+        sequence, query_results = self.query_sequence(repo, query, name)
         return sequence.resolve_context(query_results)
 
+    def iter_steps(self, repo, query, name):
+        sequence, query_results = self.query_sequence(repo, query, name)
+        return tracing.timed(sequence.iter_steps(query_results), 'resolve',
+                             sequence=name)
+
+    def iter_commands(self, repo, query, name):
+        sequence, query_results = self.query_sequence(repo, query, name)
+        return tracing.timed(sequence.iter_commands(query_results),
+                             'resolve', sequence=name)
+
     def resolve(self, repo, query, name):
-        sequence = self.get_sequence(name)
-        query = TaskSequenceQuery(sequence, query)
-        query_results = repo.query(query.query_args, resolve=True)
-        results = []
-        sequence.resolve(query_results, results)
-        return results
+        return list(self.iter_commands(repo, query, name))
 
-    def run_sequence(self, repo, query, name):
-        for cmd in self.resolve(repo, query, name):
-            yield repo.invoke(*parse_task(cmd))
+    def resolve_steps(self, repo, query, name):
+        return list(self.iter_steps(repo, query, name))
+
+    def run_sequence(self, repo, query, name, jobs=None, batch=False):
+        return run_steps(repo, self.iter_steps(repo, query, name), jobs,
+                         batch)
+
+    def arun_sequence(self, repo, query, name, jobs=None):
+        from . import aio
+        return aio.run_sequence(self, repo, query, name, jobs=jobs)
 
 
 class TaskSequence(object):
+    valid_options = ['once']
+
     def __init__(self, sequences, sequence, name):
-        if not isinstance(sequence, dict_types) or len(sequence) != 1:
+        if not isinstance(sequence, dict_types):
+            raise InvalidTaskSequence(
+                'task sequence must have only one argument')
+        arguments = [key for key in sequence
+                     if key not in self.valid_options]
+        if len(arguments) != 1:
             raise InvalidTaskSequence(
                 'task sequence must have only one argument')
-        argument_name = next(iter(sequence.keys()))
+        argument_name = arguments[0]
         self.name = name
+        self.once = bool(sequence.get('once', False))
         self.arguments = sequences.get_argument(argument_name)
         self.sequences = sequences
         if not isinstance(sequence[argument_name], list):
@@ -156,19 +392,46 @@ class TaskSequence(object):
                         'subtask arguments are incompatible with parent task '
                         'sequence arguments')
 
+    def get_join_kinds(self):
+        kinds = list(self.arguments.join_kinds)
+        for subtask in self.sequence:
+            if 'seq' == subtask.type:
+                sequence = self.sequences.get_sequence(subtask.template)
+                for kind in sequence.get_join_kinds():
+                    if kind not in kinds:
+                        kinds.append(kind)
+        return kinds
+
     def resolve_context(self, query_results):
         return self.arguments.build_context(query_results)
 
     def resolve(self, query_results, commands):
+        commands.extend(self.iter_commands(query_results))
+
+    def iter_commands(self, query_results):
+        return (command for _, command, _ in
+                self._iter_rendered(query_results))
+
+    def iter_steps(self, query_results):
+        return (subtask.get_step(command, context) for subtask, command,
+                context in self._iter_rendered(query_results))
+
+    def _iter_rendered(self, query_results):
+        rendered = self._render_all(query_results)
+        if self.once:
+            rendered = iter_unique_commands(rendered)
+        return rendered
+
+    def _render_all(self, query_results):
         for subtask in self.sequence:
             if 'seq' == subtask.type:
                 sequence = self.sequences.get_sequence(subtask.template)
-                sequence.resolve(query_results, commands)
+                for item in sequence._iter_rendered(query_results):
+                    yield item
             else:
                 for obj in self.resolve_context(query_results):
-                    command = subtask.render(**obj)
-                    parts = shlex.split(command)
-                    commands.append(command)
+                    yield (subtask, subtask.render(**obj),
+                           get_context_key(obj))
 
 
 class SubTaskSequence(object):
@@ -184,9 +447,37 @@ class SubTaskSequence(object):
         self.template = subtask[self.type]
         if not isinstance(self.template, text_types):
             raise InvalidTaskSequence('subtask template must set a string')
+        self._compiled = None
+        self._static_args = None
+        self._parsed_args = None
+
+    def compile(self):
+        self._compiled = Template(self.template)
+        try:
+            parts = split_task(self.template)
+        except ValueError:
+            parts = []
+        if 3 <= len(parts) and \
+                not any(c in parts[-1] for c in template_chars):
+            self._static_args = parts[-1]
 
     def render(self, **context):
-        return Template(self.template).render(**context)
+        if self._compiled is None:
+            self.compile()
+        if tracing.tracer is not None:
+            with tracing.tracer.span('render', template=self.template):
+                return self._compiled.render(**context)
+        return self._compiled.render(**context)
+
+    def get_step(self, cmd, context=()):
+        if self._static_args is not None:
+            parts = split_task(cmd)
+            if len(parts) == 3 and parts[2] == self._static_args:
+                if self._parsed_args is None:
+                    self._parsed_args = parse_task_args(parts[2])
+                return TaskStep(cmd, context, parts[0], parts[1],
+                                copy(self._parsed_args))
+        return get_task_step(cmd, context)
 
 
 class InvalidTaskSequence(api.PyautoException):
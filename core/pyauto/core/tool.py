@@ -1,11 +1,13 @@
 import os
 import sys
 import json
+import time
 import argparse
 import importlib
 from collections import OrderedDict
 from pyauto.util import yamlutil
-from . import api, taskapi
+from . import api, taskapi, snapshot, resultcache, uptodate, plan
+from . import tracing, output, daemon, history
 from .api import logger
 
 
@@ -33,10 +35,23 @@ class Command(object):
     objects_filename = None
     packages_filename = None
     tasks_filename = None
+    workspace = None
+    snapshot = None
+    parse_workers = None
+    output_filename = None
+    output_stream = None
+    history = None
 
     def __init__(self, repository, objects_filename,
-                 packages_filename, tasks_filename, dirname=None):
+                 packages_filename, tasks_filename, dirname=None,
+                 workspace=None, parse_workers=None,
+                 output_filename=None):
         self.repository = repository
+        self.parse_workers = parse_workers
+        self.output_filename = output_filename
+        if workspace is None:
+            workspace = os.path.join(dirname or os.getcwd(), '.pyauto')
+        self.workspace = os.path.abspath(workspace)
         if dirname is not None:
             objects_filename = os.path.join(dirname, objects_filename)
             tasks_filename = os.path.join(dirname, tasks_filename)
@@ -69,10 +84,54 @@ class Command(object):
             print(os.linesep.join(errors))
             sys.exit(1)
 
+    def get_workspace_path(self, *path):
+        return os.path.join(self.workspace, *path)
+
+    def get_socket_path(self, filename=None):
+        if filename is None:
+            return self.get_workspace_path('daemon.sock')
+        return os.path.abspath(filename)
+
+    def enable_snapshot(self):
+        self.snapshot = snapshot.Snapshot(
+            self.get_workspace_path('snapshot.pickle'))
+
+    def enable_result_cache(self, size=1024):
+        self.repository.set_result_cache(resultcache.ResultCache(
+            self.get_workspace_path('results.sqlite'), size))
+
+    def enable_up_to_date(self):
+        self.repository.set_fingerprints(uptodate.FingerprintStore(
+            self.get_workspace_path('fingerprints.sqlite')))
+
+    def enable_history(self):
+        self.history = history.History(
+            self.get_workspace_path('history.sqlite'))
+
+    def record(self, res):
+        if self.history is not None:
+            self.history.add(res)
+        return res
+
     def load(self):
         self.read_packages()
-        self.read_objects()
-        self.read_tasks()
+        if self.snapshot is not None:
+            self.read_snapshot()
+        else:
+            self.read_objects()
+            self.read_tasks()
+
+    def read_snapshot(self):
+        key = snapshot.fingerprint(self.packages_filename,
+                                   self.objects_filename,
+                                   self.tasks_filename)
+        data = self.snapshot.get(key, lambda: OrderedDict([
+            ('objects', api.read_packages(self.objects_filename,
+                                          jobs=self.parse_workers)),
+            ('tasks', self._read_tasks()),
+        ]))
+        self.repository.load_objects(data['objects'], copy=False)
+        self.sequences = taskapi.TaskSequences(data['tasks'])
 
     def read_packages(self):
         if self.packages_filename is not None:
@@ -80,13 +139,15 @@ class Command(object):
                 self.repository.add_package(package)
 
     def read_objects(self):
-        for obj in api.read_packages(self.objects_filename):
-            self.repository.add(obj)
+        self.repository.load_file(self.objects_filename,
+                                  jobs=self.parse_workers)
 
     def read_tasks(self):
+        self.sequences = taskapi.TaskSequences(self._read_tasks())
+
+    def _read_tasks(self):
         with open(self.tasks_filename) as f:
-            sequences = yamlutil.load_dict(f)
-        self.sequences = taskapi.TaskSequences(sequences)
+            return yamlutil.load_dict(f)
 
     def _read_packages(self, fn):
         with open(fn) as f:
@@ -127,44 +188,150 @@ class Command(object):
         ])
         logger.debug(yamlutil.dump_dict(data))
 
+    def open_output(self, args, **options):
+        if self.output_stream is not None:
+            return output.OutputWriter(self.output_stream, args.format,
+                                       **options)
+        return output.open_output(self.output_filename, args.format,
+                                  **options)
+
     def run_query(self, args):
         q = yamlutil.load_dict(args.selector)
         res = self.repository.query(q, tag=True, resolve=True)
-        logger.debug(render_output(args.format, res))
+        with self.open_output(args) as out:
+            out.write(res)
+
+    def show_impact(self, args):
+        res = self.repository.impact(args.ref)
+        if args.direct:
+            del res['transitive']
+        with self.open_output(args) as out:
+            out.write(res)
+
+    def invoke_task(self, args):
+        res = self.repository.invoke(args.task, args.tag, args.args)
+        with self.open_output(args) as out:
+            out.write(self.record(res))
 
     def resolve_context(self, args):
         query = yamlutil.load_dict(args.query)
-        for res in self.sequences.resolve_context(query):
-            logger.debug(render_output(args.format, res))
+        with self.open_output(args) as out:
+            for res in self.sequences.resolve_context(query):
+                out.write(res)
+
+    def get_fingerprint(self):
+        return plan.fingerprint(self.packages_filename,
+                                self.objects_filename,
+                                self.tasks_filename)
+
+    def get_query(self, args):
+        if args.query is None or args.sequence is None:
+            raise api.PyautoException(
+                'a query and a sequence are required')
+        return yamlutil.load_dict(args.query)
+
+    def get_steps(self, args):
+        return self.sequences.iter_steps(
+            self.repository, self.get_query(args), args.sequence)
+
+    def get_commands(self, args):
+        if args.plan is None and args.shard is None:
+            return self.sequences.iter_commands(
+                self.repository, self.get_query(args), args.sequence)
+        return (step.command for step in self.get_plan_steps(args))
+
+    def write_plan(self, args):
+        steps = self.get_steps(args)
+        header = dict(query=args.query, sequence=args.sequence)
+        if args.output is None:
+            plan.write_plan(self.output_stream or sys.stdout, steps,
+                            self.get_fingerprint(), **header)
+        else:
+            with open(args.output, 'w') as f:
+                plan.write_plan(f, steps, self.get_fingerprint(), **header)
+
+    def read_plan(self, filename):
+        with open(filename) as f:
+            _, steps = plan.read_plan(f, self.get_fingerprint())
+        return steps
+
+    def get_plan_steps(self, args):
+        if args.plan is not None:
+            steps = self.read_plan(args.plan)
+        else:
+            steps = self.get_steps(args)
+        if args.shard is not None:
+            steps = plan.shard_steps(steps, *plan.parse_shard(args.shard))
+        return steps
 
     def run_sequence(self, args):
-        query = yamlutil.load_dict(args.query)
         if args.inspect:
-            logger.debug(render_output(args.format, [
-                task
-                for task in self.sequences.resolve(
-                    self.repository, query, args.sequence)
-            ]))
+            with self.open_output(args) as out:
+                for line in render_list(args.format,
+                                        self.get_commands(args)):
+                    out.write_text(line)
+            return
+        steps = self.get_plan_steps(args)
+        if args.asyncio:
+            from . import aio
+            with self.open_output(args, batch_size=1) as out:
+                aio.consume(aio.run_steps(
+                    self.repository, steps, jobs=args.run_jobs),
+                    lambda res: out.write(self.record(res)))
         else:
-            for res in self.sequences.run_sequence(
-                    self.repository, query, args.sequence):
-                logger.debug(render_output(args.format, res))
+            with self.open_output(args, batch_size=1) as out:
+                for res in taskapi.run_steps(
+                        self.repository, steps, jobs=args.run_jobs,
+                        batch=args.batch):
+                    out.write(self.record(res))
 
     def dump(self, args):
         if args.packages:
-            for item in self.repository.dump_packages():
-                logger.debug('---')
-                logger.debug(render_output(args.format, item))
+            items = self.repository.dump_packages()
         else:
-            for item in self.repository.dump():
-                logger.debug('---')
-                logger.debug(render_output(args.format, item))
+            items = self.repository.dump()
+        with self.open_output(args) as out:
+            for item in items:
+                out.write(item)
+
+    def show_history(self, args):
+        if self.history is None:
+            self.enable_history()
+        since = None
+        if args.since is not None:
+            since = time.time() - args.since * 86400
+        if 'slowest' == args.report:
+            items = self.history.slowest(args.limit, since, args.task)
+        else:
+            group = 'kind' if 'kinds' == args.report else 'task'
+            items = self.history.stats(group, since, args.task)
+        with self.open_output(args) as out:
+            for item in items:
+                out.write(item)
+
+    def serve(self, args, parser):
+        daemon.serve(daemon.Daemon(self, parser, run_action),
+                     self.get_socket_path(args.socket))
+
+    def forward(self, args, argv):
+        data = OrderedDict([
+            ('files', [self.packages_filename, self.objects_filename,
+                       self.tasks_filename]),
+            ('cwd', os.getcwd()),
+            ('argv', argv),
+        ])
+        filename = self.get_socket_path(args.socket)
+        if self.output_filename is None:
+            daemon.request(filename, data, sys.stdout.write)
+        else:
+            with open(self.output_filename, 'w') as f:
+                daemon.request(filename, data, f.write)
 
 
 def render_output(format, data):
     if 'prettyjson' == format:
         return json.dumps(data, indent=2)
-    elif 'json' == format:
+    elif format in ('json', 'jsonl'):
         return json.dumps(data)
     elif 'yaml' == format:
         return yamlutil.dump_dict(data)
@@ -174,41 +341,144 @@ def render_output(format, data):
         raise api.PyautoException('Invalid output format: {0}'.format(format))
 
 
-def main():
-    api.setup_logger(api.logger)
+def render_list(format, items):
+    first = True
+    if 'jsonl' == format:
+        for item in items:
+            yield render_output(format, item)
+        return
+    elif 'yaml' == format:
+        for item in items:
+            yield render_output(format, [item]).rstrip('\n')
+            first = False
+        if first:
+            yield render_output(format, []).rstrip('\n')
+        return
+    for item in items:
+        yield ('[' if first else ',') + render_output(format, item)
+        first = False
+    yield '[]' if first else ']'
+
+
+def get_parser():
     args = argparse.ArgumentParser()
     args.add_argument('-d', dest='dirname')
     args.add_argument('-o', dest='objects_filename', required=True)
     args.add_argument('-t', dest='tasks_filename', required=True)
     args.add_argument('-p', dest='packages_filename', required=True)
-    args.add_argument('-f', '--format', dest='format', choices=[
-        'yaml', 'json', 'prettyjson'], default='yaml')
+    args.add_argument('-w', '--workspace', dest='workspace')
+    args.add_argument('-j', '--parse-workers', dest='parse_workers',
+                      type=int, default=1)
+    args.add_argument('--snapshot', dest='snapshot', action='store_true')
+    args.add_argument('--cache', dest='cache', action='store_true')
+    args.add_argument('--up-to-date', dest='up_to_date', action='store_true')
+    args.add_argument('--history', dest='history', action='store_true')
+    args.add_argument('--trace', dest='trace')
+    args.add_argument('--cache-size', dest='cache_size', type=int,
+                      default=1024)
+    args.add_argument('-f', '--format', dest='format',
+                      choices=output.formats, default='yaml')
+    args.add_argument('--output-file', dest='output_filename')
+    args.add_argument('--socket', dest='socket')
+    args.add_argument('--client', dest='client', action='store_true')
 
     parsers = args.add_subparsers(dest='action')
     run = parsers.add_parser('run')
-    run.add_argument('query')
-    run.add_argument('sequence')
+    run.add_argument('query', nargs='?')
+    run.add_argument('sequence', nargs='?')
+    run.add_argument('--plan', dest='plan')
+    run.add_argument('--shard', dest='shard')
     run.add_argument('-a', '--args', dest='args', default='{}',
                      type=yamlutil.load_dict)
     run.add_argument('-i', '--inspect', dest='inspect', action='store_true')
+    run.add_argument('--jobs', dest='run_jobs', type=int)
+    run.add_argument('--asyncio', dest='asyncio', action='store_true')
+    run.add_argument('--batch', dest='batch', action='store_true')
+    resolve = parsers.add_parser('resolve')
+    resolve.add_argument('query')
+    resolve.add_argument('sequence')
+    resolve.add_argument('--output', dest='output')
     query = parsers.add_parser('query')
     query.add_argument('selector')
     query.add_argument('-v', '--verbose', dest='verbose', action='store_true')
+    impact = parsers.add_parser('impact')
+    impact.add_argument('ref')
+    impact.add_argument('--direct', dest='direct', action='store_true')
     dump = parsers.add_parser('dump')
     dump.add_argument('--packages', action='store_true')
-    args = args.parse_args()
+    invoke = parsers.add_parser('invoke')
+    invoke.add_argument('task')
+    invoke.add_argument('tag')
+    invoke.add_argument('-a', '--args', dest='args', default='{}',
+                        type=yamlutil.load_dict)
+    parsers.add_parser('serve')
+    show_history = parsers.add_parser('history')
+    show_history.add_argument('report', nargs='?', default='tasks',
+                              choices=['tasks', 'kinds', 'slowest'])
+    show_history.add_argument('--since', dest='since', type=float)
+    show_history.add_argument('--task', dest='task')
+    show_history.add_argument('--limit', dest='limit', type=int, default=10)
+    return args
+
+
+def main():
+    api.setup_logger(api.logger)
+    parser = get_parser()
+    args = parser.parse_args()
 
     r = api.Repository()
     cmd = Command(r, args.objects_filename, args.packages_filename,
-                  args.tasks_filename, dirname=args.dirname)
+                  args.tasks_filename, dirname=args.dirname,
+                  workspace=args.workspace,
+                  parse_workers=args.parse_workers,
+                  output_filename=args.output_filename)
     cmd.validate_files()
-    cmd.load()
+    if args.client:
+        cmd.forward(args, sys.argv[1:])
+        return
+    if args.snapshot:
+        cmd.enable_snapshot()
+    if args.cache:
+        cmd.enable_result_cache(args.cache_size)
+    if args.up_to_date:
+        cmd.enable_up_to_date()
+    if args.history:
+        cmd.enable_history()
+    tracer = None
+    if args.trace is not None:
+        tracer = tracing.Tracer()
+        tracing.set_tracer(tracer)
+    try:
+        with tracing.span('tool', action=args.action):
+            if 'history' != args.action:
+                with tracing.span('load'):
+                    cmd.load()
+            if 'serve' == args.action:
+                cmd.serve(args, parser)
+            else:
+                run_action(cmd, args)
+    finally:
+        if cmd.history is not None:
+            cmd.history.flush()
+        if tracer is not None:
+            tracer.save(args.trace)
+
+
+def run_action(cmd, args):
     if 'run' == args.action:
         cmd.run_sequence(args)
+    elif 'resolve' == args.action:
+        cmd.write_plan(args)
     elif 'query' == args.action:
         cmd.run_query(args)
+    elif 'impact' == args.action:
+        cmd.show_impact(args)
     elif 'dump' == args.action:
         cmd.dump(args)
+    elif 'invoke' == args.action:
+        cmd.invoke_task(args)
+    elif 'history' == args.action:
+        cmd.show_history(args)
     else:
         cmd.show_files()
 
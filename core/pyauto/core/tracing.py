@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import threading
+import itertools
+from collections import OrderedDict
+
+
+tracer = None
+
+
+def get_tracer():
+    return tracer
+
+
+def set_tracer(value):
+    global tracer
+    previous = tracer
+    tracer = value
+    return previous
+
+
+def span(name, category='pyauto', **args):
+    if tracer is None:
+        return noop
+    return tracer.span(name, category, **args)
+
+
+def detached_span(name, category='pyauto', **args):
+    if tracer is None:
+        return noop
+    return tracer.detached_span(name, category, **args)
+
+
+def timed(items, name, category='pyauto', **args):
+    if tracer is None:
+        return items
+    return tracer.timed(items, name, category, **args)
+
+
+class NoopSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+noop = NoopSpan()
+
+
+class Span(object):
+    def __init__(self, tracer, name, category, args, detached=False):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.detached = detached
+        self.id = None
+        self.parent = None
+        self.start = None
+
+    def __enter__(self):
+        stack = self.tracer.get_stack()
+        self.id = next(self.tracer.ids)
+        self.parent = stack[-1].id if stack else None
+        if not self.detached:
+            stack.append(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.time() - self.start
+        if not self.detached:
+            self.tracer.get_stack().pop()
+        if exc[0] is not None:
+            self.args['error'] = str(exc[1])
+        self.tracer.add(self, duration)
+        return False
+
+
+class Tracer(object):
+    def __init__(self):
+        self.events = []
+        self.ids = itertools.count(1)
+        self.pid = os.getpid()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def get_stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name, category='pyauto', **args):
+        return Span(self, name, category, args)
+
+    def detached_span(self, name, category='pyauto', **args):
+        return Span(self, name, category, args, detached=True)
+
+    def timed(self, items, name, category='pyauto', **args):
+        span = Span(self, name, category, args, detached=True)
+        span.__enter__()
+        duration = 0
+        count = 0
+        items = iter(items)
+        try:
+            while True:
+                stack = self.get_stack()
+                stack.append(span)
+                start = time.time()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                finally:
+                    duration += time.time() - start
+                    stack.pop()
+                count += 1
+                yield item
+        finally:
+            span.args['count'] = count
+            self.add(span, duration)
+
+    def add(self, span, duration):
+        event = OrderedDict([
+            ('name', span.name),
+            ('cat', span.category),
+            ('ph', 'X'),
+            ('ts', span.start * 1e6),
+            ('dur', duration * 1e6),
+            ('pid', self.pid),
+            ('tid', threading.current_thread().ident),
+            ('id', span.id),
+            ('parent', span.parent),
+            ('args', span.args),
+        ])
+        with self._lock:
+            self.events.append(event)
+
+    def iter_events(self):
+        return iter(sorted(self.events, key=lambda e: e['ts']))
+
+    def write_chrome(self, f):
+        json.dump(OrderedDict([
+            ('traceEvents', list(self.iter_events())),
+            ('displayTimeUnit', 'ms'),
+        ]), f, default=str)
+
+    def write_jsonl(self, f):
+        for event in self.iter_events():
+            f.write(json.dumps(event, default=str) + '\n')
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            if filename.endswith('.jsonl'):
+                self.write_jsonl(f)
+            else:
+                self.write_chrome(f)
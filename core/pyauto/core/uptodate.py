@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from . import api, sqlitedb
+
+
+def resolve_value(obj, spec):
+    value = obj
+    for name in spec.split('.'):
+        value = getattr(value, name)
+        if isinstance(value, api.Relation):
+            value = value.value
+        elif callable(value):
+            value = value()
+        if value is None:
+            return None
+    return value
+
+
+def resolve_paths(obj, spec):
+    value = resolve_value(obj, spec)
+    if value is None:
+        return []
+    elif not isinstance(value, (list, tuple)):
+        value = [value]
+    return [os.path.abspath(os.path.expanduser(path))
+            for path in value if path is not None]
+
+
+def fingerprint_inputs(paths):
+    result = []
+    for path in paths:
+        if not os.path.exists(path):
+            result.append([path, None, None])
+            continue
+        for filename in api.iter_files(path):
+            stat = os.stat(filename)
+            result.append([filename, stat.st_mtime, stat.st_size])
+    return result
+
+
+def fingerprint_outputs(paths):
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            result.append([path, True, None])
+        if os.path.exists(path):
+            for filename in api.iter_files(path):
+                stat = os.stat(filename)
+                result.append([filename, stat.st_mtime, stat.st_size])
+        else:
+            result.append([path, False, None])
+    return result
+
+
+def dumps(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class FingerprintStore(sqlitedb.Store):
+    schema = [
+        'CREATE TABLE IF NOT EXISTS tasks ('
+        'key TEXT PRIMARY KEY, record TEXT)',
+    ]
+
+    def load(self, key):
+        row = self.connect().execute(
+            'SELECT record FROM tasks WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def save(self, key, record):
+        conn = self.connect()
+        conn.execute('INSERT OR REPLACE INTO tasks VALUES (?, ?)',
+                     (key, dumps(record)))
+        conn.commit()
+        return record
+
+    def check(self, repo, task, obj, args):
+        if not any(key in task.options
+                   for key in ['inputs', 'outputs', 'state']):
+            return None
+        return UpToDateCheck(self, repo, task, obj, args)
+
+
+class UpToDateCheck(object):
+    def __init__(self, store, repo, task, obj, args):
+        self.store = store
+        self.key = hashlib.sha1(dumps([task.name, obj.ref])
+                                .encode('utf-8')).hexdigest()
+        self.outputs = [
+            path for spec in task.options.get('outputs', [])
+            for path in resolve_paths(obj, spec)]
+        self.state = dumps(OrderedDict([
+            ('digest', repo.digest(obj)),
+            ('args', args),
+            ('inputs', fingerprint_inputs([
+                path for spec in task.options.get('inputs', [])
+                for path in resolve_paths(obj, spec)])),
+            ('state', [resolve_value(obj, spec)
+                       for spec in task.options.get('state', [])]),
+        ]))
+        self.result = None
+
+    def is_up_to_date(self):
+        if not self.outputs:
+            return False
+        record = self.store.load(self.key)
+        if record is None or record['state'] != self.state or \
+                record['outputs'] != fingerprint_outputs(self.outputs):
+            return False
+        self.result = record['result']
+        return True
+
+    def save(self, output):
+        return self.store.save(self.key, OrderedDict([
+            ('state', self.state),
+            ('outputs', fingerprint_outputs(self.outputs)),
+            ('result', output['result']),
+        ]))
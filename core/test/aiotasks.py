@@ -0,0 +1,24 @@
+import asyncio
+from pyauto.core import api
+
+
+class Fetch(api.KindObject):
+    async def fetch(self, delay=0.01):
+        await asyncio.sleep(delay)
+        if 'bad' in self.labels:
+            raise Exception('failed: {0}'.format(self.tag))
+        return self.tag
+
+    def read(self):
+        return self.tag.upper()
+
+
+async def invoke_in_loop(repo):
+    kt = repo['net.Host'].kind.tasks['fetch']
+    result = await kt.invoke(repo['net.Host/h1'], delay=0)
+    output = await repo.invoke('net.Host.fetch', 'h3', {})
+    return result, output
+
+
+async def invoke_many_in_loop(repo):
+    return repo.invoke_many([('net.Host.fetch', 'h1', {})])
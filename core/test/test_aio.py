@@ -0,0 +1,151 @@
+import six
+from unittest import TestCase, skipIf
+from pyauto.core import api, taskapi, tracing
+from . import data
+
+if six.PY3:
+    from pyauto.core import aio
+    from . import aiotasks
+
+
+fetch_packages = """
+package: net
+version: 0.0.0
+kinds:
+  - kind: Host
+    configs: test.aiotasks.Fetch
+    tasks:
+      - fetch
+      - read
+"""
+
+fetch_objects = """
+---
+kind: net.Host
+tag: h1
+---
+kind: net.Host
+tag: h2
+labels: [bad]
+---
+kind: net.Host
+tag: h3
+"""
+
+fetch_sequences = """
+arguments:
+  hosts: {host: net.Host}
+sequences:
+  fetch:
+    hosts:
+      - task: net.Host.fetch {{host.tag}}
+      - task: net.Host.read {{host.tag}}
+"""
+
+
+def get_repository():
+    repo = api.Repository()
+    repo.load_packages([api.yamlutil.load_dict(fetch_packages)])
+    repo.parse_objects(fetch_objects)
+    return repo
+
+
+def collect(results):
+    items = []
+    aio.consume(results, items.append)
+    return items
+
+
+@skipIf(six.PY2, 'asyncio requires Python 3')
+class Invoke(TestCase):
+    def test_is_coroutine(self):
+        tasks = get_repository()['net.Host'].kind.tasks
+        self.assertTrue(tasks['fetch'].is_coroutine)
+        self.assertFalse(tasks['read'].is_coroutine)
+
+    def test_sync_invoke_coroutine(self):
+        res = get_repository().invoke('net.Host.fetch', 'h1', {})
+        self.assertEqual(res['result'], 'h1')
+
+    def test_invoke_in_running_loop(self):
+        repo = get_repository()
+        result, output = aio.run(aiotasks.invoke_in_loop(repo))
+        self.assertEqual(result, 'h1')
+        self.assertEqual(output['result'], 'h3')
+        self.assertEqual(output['obj'], 'net.Host/h3')
+        with self.assertRaises(api.InvalidKindObjectTaskInvocationException):
+            aio.run(aiotasks.invoke_many_in_loop(repo))
+
+    def test_ainvoke(self):
+        repo = get_repository()
+        res = aio.run(repo.ainvoke('net.Host.fetch', 'h1', {'delay': 0}))
+        self.assertEqual(res['result'], 'h1')
+        self.assertEqual(res['obj'], 'net.Host/h1')
+        res = aio.run(repo.ainvoke('net.Host.read', 'h3', None))
+        self.assertEqual(res['result'], 'H3')
+
+    def test_ainvoke_traced(self):
+        tracer = tracing.Tracer()
+        previous = tracing.set_tracer(tracer)
+        try:
+            aio.run(get_repository().ainvoke_many([
+                ('net.Host.fetch', 'h1', {}),
+                ('net.Host.fetch', 'h3', {}),
+            ], jobs=2))
+        finally:
+            tracing.set_tracer(previous)
+        events = [e for e in tracer.events if e['name'] == 'invoke']
+        self.assertListEqual(sorted(e['args']['obj'] for e in events),
+                             ['net.Host/h1', 'net.Host/h3'])
+        self.assertListEqual(tracer.get_stack(), [])
+
+    def test_ainvoke_sync_task(self):
+        repo = api.Repository()
+        repo.load_packages(data.packages)
+        repo.load_objects(data.objects)
+        res = aio.run(repo.ainvoke('deploy.Region.login', 'abc1', {}))
+        self.assertEqual(res['task'], 'deploy.Region.login')
+
+    def test_ainvoke_many(self):
+        repo = get_repository()
+        res = aio.run(repo.ainvoke_many([
+            ('net.Host.fetch', 'h3', {'delay': 0.05}),
+            ('net.Host.read', 'h1', None),
+            ('net.Host.fetch', 'h1', {}),
+        ], jobs=3))
+        self.assertListEqual([r['result'] for r in res], ['h3', 'H1', 'h1'])
+
+    def test_ainvoke_many_invalid_jobs(self):
+        with self.assertRaises(api.PyautoException):
+            aio.run(get_repository().ainvoke_many([], jobs=-1))
+
+
+@skipIf(six.PY2, 'asyncio requires Python 3')
+class RunSequence(TestCase):
+    def test_run(self):
+        repo = api.Repository()
+        repo.load_packages(data.packages)
+        repo.load_objects(data.objects)
+        sequences = taskapi.TaskSequences(data.sequences)
+        res = collect(sequences.arun_sequence(
+            repo, data.query, 'deploy_app', jobs=4))
+        self.assertEqual(len(res), 39)
+        self.assertTrue(all('error' not in r for r in res))
+
+    def test_failure_isolation(self):
+        sequences = taskapi.TaskSequences(
+            api.yamlutil.load_dict(fetch_sequences))
+        res = collect(sequences.arun_sequence(
+            get_repository(), {}, 'fetch', jobs=8))
+        self.assertEqual(len(res), 6)
+        errors = [(r['task'], r['obj'], r['error'])
+                  for r in res if 'error' in r]
+        self.assertListEqual(sorted(errors), [
+            ('net.Host.fetch', 'net.Host/h2', 'failed: h2'),
+            ('net.Host.read', 'net.Host/h2',
+             'skipped: dependency failed: net.Host.fetch h2'),
+        ])
+
+    def test_invalid_jobs(self):
+        with self.assertRaises(api.PyautoException):
+            aio.AsyncExecutor(get_repository(), 0)
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+from pyauto.core import api, tool, daemon
+from pyauto.util import yamlutil
+
+dirname = os.path.dirname(os.path.abspath(__file__))
+example = os.path.join(dirname, 'objects-example')
+
+
+class Daemon(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.example = os.path.join(self.dirname, 'example')
+        shutil.copytree(example, self.example)
+        self.cmd = tool.Command(api.Repository(), 'objects', 'pkg.yml',
+                                'tasks.yml', dirname=self.example)
+        self.cmd.load()
+        self.daemon = daemon.Daemon(self.cmd, tool.get_parser(),
+                                    tool.run_action)
+        self.socket = os.path.join(self.dirname, 'daemon.sock')
+        self.server = daemon.Server(self.socket, self.daemon)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.dirname)
+
+    def request(self, *argv, **data):
+        data.setdefault('files', self.daemon.files)
+        data['argv'] = ['-o', 'objects', '-t', 'tasks.yml', '-p', 'pkg.yml',
+                        '-f', 'json'] + list(argv)
+        out = []
+        daemon.request(self.socket, data, out.append)
+        return [yamlutil.load_dict(line)
+                for line in ''.join(out).splitlines()]
+
+    def test_query(self):
+        res = self.request('query', '{test.Region: {all: true}}')
+        self.assertListEqual(res[0]['test.Region'], ['r1'])
+
+    def test_invoke(self):
+        res = self.request('invoke', 'test.Region.login', 'r1')
+        self.assertEqual(res[0]['obj'], 'test.Region/r1')
+
+    def test_reload(self):
+        filename = os.path.join(self.example, 'objects', 'more.yml')
+        with open(filename, 'w') as f:
+            f.write('kind: test.Region\ntag: r2\n')
+        res = self.request('query', '{test.Region: {all: true}}')
+        self.assertListEqual(res[0]['test.Region'], ['r1', 'r2'])
+        os.remove(filename)
+        res = self.request('query', '{test.Region: {all: true}}')
+        self.assertListEqual(res[0]['test.Region'], ['r1'])
+
+    def test_reload_error(self):
+        filename = os.path.join(self.example, 'objects', 'more.yml')
+        tasks = os.path.join(self.example, 'tasks.yml')
+        with open(filename, 'w') as f:
+            f.write('kind: test.Region\ntag: r2\nlabels: 5\n')
+        with open(tasks, 'a') as f:
+            f.write('  regions_login_again:\n    region:\n'
+                    '      - seq: regions_login\n')
+        for _ in range(2):
+            with self.assertRaises(daemon.DaemonException):
+                self.request('query', '{test.Region: {all: true}}')
+        with open(filename, 'w') as f:
+            f.write('kind: test.Region\ntag: r2\n')
+        res = self.request('query', '{test.Region: {all: true}}')
+        self.assertListEqual(res[0]['test.Region'], ['r1', 'r2'])
+        res = self.request('resolve', '{reg: {all: true}}',
+                           'regions_login_again')
+        self.assertListEqual([step['command'] for step in res[1:]], [
+            'test.Region.login r1', 'test.Region.login r2'])
+
+    def test_reload_packages_error(self):
+        repo = self.cmd.repository
+        filename = os.path.join(self.example, 'pkg.yml')
+        with open(filename) as f:
+            packages = f.read()
+        with open(filename, 'w') as f:
+            f.write('packages:\n- module: test.missing\n')
+        for _ in range(2):
+            with self.assertRaises(daemon.DaemonException):
+                self.request('query', '{test.Region: {all: true}}')
+            self.assertIs(self.cmd.repository, repo)
+        with open(filename, 'w') as f:
+            f.write(packages)
+        res = self.request('query', '{test.Region: {all: true}}')
+        self.assertListEqual(res[0]['test.Region'], ['r1'])
+        self.assertIsNot(self.cmd.repository, repo)
+
+    def test_errors(self):
+        with self.assertRaises(daemon.DaemonException):
+            self.request('serve')
+        with self.assertRaises(daemon.DaemonException):
+            self.request('dump', files=['a', 'b', 'c'])
+        with self.assertRaises(daemon.DaemonException):
+            self.request('invoke', 'test.Region.login', 'r9')
+        for option in ['--cache', '--snapshot', '--history']:
+            with self.assertRaises(daemon.DaemonException):
+                self.request(option, 'dump')
+        with self.assertRaises(daemon.DaemonException):
+            self.request('--trace', 'trace.json', 'dump')
+
+    def test_not_listening(self):
+        with self.assertRaises(daemon.DaemonException):
+            daemon.request(os.path.join(self.dirname, 'none.sock'),
+                           {'argv': ['dump']}, None)
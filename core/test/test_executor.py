@@ -0,0 +1,248 @@
+from unittest import TestCase
+from pyauto.core import api, taskapi, executor
+from . import data
+
+
+class Flaky(api.KindObject):
+    def run(self):
+        if 'bad' in self.labels:
+            raise Exception('failed: {0}'.format(self.tag))
+        return self.tag
+
+
+class Bulk(api.KindObject):
+    batches = []
+    calls = []
+
+    def run(self, suffix=''):
+        return self.tag + suffix
+
+    @classmethod
+    def run__batch(cls, objs, suffix=''):
+        cls.batches.append([obj.tag for obj in objs])
+        return [obj.tag + suffix for obj in objs]
+
+    @staticmethod
+    def short__batch(objs):
+        return []
+
+    def short(self):
+        pass
+
+    def rm(self):
+        Bulk.calls.append(('rm', self.tag))
+
+    def copy(self):
+        Bulk.calls.append(('copy', self.tag))
+
+
+bulk_packages = """
+package: bulk
+version: 0.0.0
+kinds:
+  - kind: Job
+    configs: test.test_executor.Bulk
+    tasks:
+      - run
+      - short
+      - rm
+      - copy
+"""
+
+
+flaky_packages = """
+package: flaky
+version: 0.0.0
+kinds:
+  - kind: Job
+    configs: test.test_executor.Flaky
+    tasks:
+      - run
+  - kind: App
+    configs: test.test_executor.Flaky
+    tasks: []
+"""
+
+flaky_objects = """
+---
+kind: flaky.Job
+tag: r1
+---
+kind: flaky.Job
+tag: r2
+labels: [bad]
+---
+kind: flaky.Job
+tag: r1_a
+---
+kind: flaky.Job
+tag: r2_a
+---
+kind: flaky.App
+tag: a
+"""
+
+flaky_sequences = """
+arguments:
+  one: {reg: flaky.Job}
+  two: {reg: flaky.Job, app: flaky.App}
+sequences:
+  first:
+    one:
+      - task: flaky.Job.run {{reg.tag}}
+  second:
+    two:
+      - task: flaky.Job.run {{reg.tag}}_{{app.tag}}
+  both:
+    two:
+      - seq: first
+      - seq: second
+"""
+
+
+def get_repository():
+    r = api.Repository()
+    r.load_packages(data.packages)
+    r.load_objects(data.objects)
+    return r
+
+
+def get_steps():
+    sequences = taskapi.TaskSequences(data.sequences)
+    return sequences.resolve_steps(get_repository(), data.query, 'deploy_app')
+
+
+class TaskGraph(TestCase):
+    def setUp(self):
+        self.graph = executor.TaskGraph(get_steps())
+        self.index = {step.command: i
+                      for i, step in enumerate(self.graph.steps)}
+
+    def depends(self, cmd, dep):
+        return self.index[dep] in self.graph.dependencies[self.index[cmd]]
+
+    def test_len(self):
+        self.assertEqual(len(self.graph), 39)
+
+    def test_roots(self):
+        self.assertListEqual(
+            [self.graph.steps[i].command for i in self.graph.roots()], [
+                'deploy.Region.login abc1',
+                'deploy.Region.login abc2',
+                'deploy.Region.login abc3'])
+
+    def test_edges(self):
+        self.assertTrue(self.depends('file.Directory.rmtree abc1_a',
+                                     'deploy.Region.login abc1'))
+        self.assertFalse(self.depends('file.Directory.rmtree abc1_a',
+                                      'deploy.Region.login abc2'))
+        self.assertTrue(self.depends('file.Directory.copytree abc2_b',
+                                     'file.Directory.rmtree abc2_b'))
+        self.assertFalse(self.depends('file.Directory.copytree abc2_b',
+                                      'file.Directory.rmtree abc2_a'))
+        self.assertTrue(self.depends('deploy.RegionApp.push_app abc3_c',
+                                     'file.File.render_template abc3_c'))
+
+    def test_descendants(self):
+        res = self.graph.descendants(self.index['deploy.Region.login abc1'])
+        self.assertEqual(len(res), 12)
+
+
+class Executor(TestCase):
+    def test_run(self):
+        repo = get_repository()
+        res = list(executor.Executor(repo, 4).run(get_steps()))
+        self.assertEqual(len(res), 39)
+        self.assertEqual(len(set((r['task'], r['obj']) for r in res)), 39)
+        self.assertTrue(all('error' not in r for r in res))
+
+    def test_run_order(self):
+        repo = get_repository()
+        res = list(executor.Executor(repo, 4).run(get_steps()))
+        done = [(r['task'], r['obj']) for r in res]
+        self.assertLess(
+            done.index(('file.Directory.rmtree', 'file.Directory/abc2_c')),
+            done.index(('file.Directory.copytree', 'file.Directory/abc2_c')))
+
+    def test_invalid_jobs(self):
+        with self.assertRaises(api.PyautoException):
+            executor.Executor(get_repository(), 0)
+
+    def test_failure_isolation(self):
+        repo = api.Repository()
+        repo.load_packages([api.yamlutil.load_dict(flaky_packages)])
+        repo.parse_objects(flaky_objects)
+        sequences = taskapi.TaskSequences(
+            api.yamlutil.load_dict(flaky_sequences))
+        query = {'reg': {'tags': ['r1', 'r2']}, 'app': {'tags': ['a']}}
+        res = list(sequences.run_sequence(repo, query, 'both', jobs=2))
+        by_obj = {r['obj']: r for r in res}
+        self.assertEqual(by_obj['flaky.Job/r1']['result'], 'r1')
+        self.assertEqual(by_obj['flaky.Job/r1_a']['result'], 'r1_a')
+        self.assertEqual(by_obj['flaky.Job/r2']['error'], 'failed: r2')
+        self.assertTrue(by_obj['flaky.Job/r2_a']['error']
+                        .startswith('skipped'))
+
+
+class BatchExecutor(TestCase):
+    def setUp(self):
+        Bulk.batches = []
+        Bulk.calls = []
+        self.repo = api.Repository()
+        self.repo.load_packages([api.yamlutil.load_dict(bulk_packages)])
+        self.repo.load_objects([{'kind': 'bulk.Job', 'tag': tag}
+                                for tag in ['a', 'b', 'c']])
+
+    def test_invoke_many(self):
+        res = self.repo.invoke_many([
+            ('bulk.Job.run', 'a', {}),
+            ('bulk.Job.run', 'b', {'suffix': '!'}),
+            ('bulk.Job.run', 'c', {}),
+        ])
+        self.assertListEqual([r['result'] for r in res], ['a', 'b!', 'c'])
+        self.assertListEqual(Bulk.batches, [['a', 'c'], ['b']])
+        self.assertEqual(res[0]['batch'], 2)
+
+    def test_invoke_many_fallback(self):
+        repo = get_repository()
+        res = repo.invoke_many([('deploy.Region.login', 'abc1', {}),
+                                ('deploy.Region.login', 'abc2', {})])
+        self.assertListEqual([r['obj'] for r in res], [
+            'deploy.Region/abc1', 'deploy.Region/abc2'])
+        self.assertTrue(all('batch' not in r for r in res))
+
+    def test_invoke_many_order(self):
+        self.repo.invoke_many([
+            ('bulk.Job.rm', 'a', {}),
+            ('bulk.Job.copy', 'a', {}),
+            ('bulk.Job.rm', 'b', {}),
+        ])
+        self.assertListEqual(Bulk.calls, [
+            ('rm', 'a'), ('copy', 'a'), ('rm', 'b')])
+
+    def test_invalid_batch(self):
+        with self.assertRaises(api.InvalidKindObjectTaskInvocationException):
+            self.repo.invoke_many([('bulk.Job.short', 'a', {})])
+
+    def test_run(self):
+        res = list(executor.BatchExecutor(get_repository()).run(get_steps()))
+        self.assertEqual(len(res), 39)
+        self.assertTrue(all('error' not in r for r in res))
+        done = [(r['task'], r['obj']) for r in res]
+        self.assertLess(
+            done.index(('file.Directory.rmtree', 'file.Directory/abc2_c')),
+            done.index(('file.Directory.copytree', 'file.Directory/abc2_c')))
+
+    def test_failure_isolation(self):
+        repo = api.Repository()
+        repo.load_packages([api.yamlutil.load_dict(flaky_packages)])
+        repo.parse_objects(flaky_objects)
+        sequences = taskapi.TaskSequences(
+            api.yamlutil.load_dict(flaky_sequences))
+        query = {'reg': {'tags': ['r1', 'r2']}, 'app': {'tags': ['a']}}
+        res = list(sequences.run_sequence(repo, query, 'both', batch=True))
+        by_obj = {r['obj']: r for r in res}
+        self.assertEqual(by_obj['flaky.Job/r1_a']['result'], 'r1_a')
+        self.assertEqual(by_obj['flaky.Job/r2']['error'], 'failed: r2')
+        self.assertTrue(by_obj['flaky.Job/r2_a']['error']
+                        .startswith('skipped'))
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from collections import OrderedDict
+from pyauto.core import api, history
+
+
+def get_output(task, tag, duration, **extra):
+    output = OrderedDict([
+        ('task', 'deploy.Region.' + task),
+        ('obj', 'deploy.Region/' + tag),
+        ('time', 1000.0 + duration),
+        ('duration', duration),
+        ('result', None),
+    ])
+    output.update(extra)
+    return output
+
+
+class History(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.history = history.History(
+            os.path.join(self.dirname, 'history.sqlite'), batch_size=3)
+        for i in range(1, 21):
+            self.history.add(get_output('login', 'r{0}'.format(i % 2), i))
+        self.history.add(get_output('logout', 'r1', 0.5))
+        self.history.add(get_output('logout', 'r1', 5, cached=True))
+        self.history.add(get_output('logout', 'r2', 1, error='boom'))
+        self.history.flush()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_len(self):
+        self.assertEqual(len(self.history), 23)
+
+    def test_batches(self):
+        self.history.add(get_output('login', 'r1', 1))
+        self.assertEqual(len(self.history._pending), 1)
+        self.history.add(get_output('login', 'r1', 1))
+        self.history.add(get_output('login', 'r1', 1))
+        self.assertEqual(len(self.history._pending), 0)
+
+    def test_stats(self):
+        login, logout = list(self.history.stats())
+        self.assertEqual(login['task'], 'deploy.Region.login')
+        self.assertEqual(login['count'], 20)
+        self.assertEqual(login['p50'], 10)
+        self.assertEqual(login['p95'], 19)
+        self.assertEqual(login['max'], 20)
+        self.assertEqual(logout['count'], 1)
+        self.assertEqual(logout['errors'], 1)
+
+    def test_stats_kind(self):
+        res = list(self.history.stats('kind', task='deploy.Region.login'))
+        self.assertEqual(res[0]['kind'], 'deploy.Region')
+        self.assertEqual(res[0]['count'], 20)
+        with self.assertRaises(api.PyautoException):
+            list(self.history.stats('obj'))
+
+    def test_since(self):
+        res = list(self.history.stats(since=1016))
+        self.assertEqual(res[0]['count'], 5)
+
+    def test_slowest(self):
+        res = list(self.history.slowest(limit=2))
+        self.assertListEqual([r['obj'] for r in res],
+                             ['deploy.Region/r0', 'deploy.Region/r1'])
+        self.assertEqual(res[0]['max'], 20)
+        self.assertEqual(res[0]['count'], 10)
+
+    def test_status(self):
+        self.assertEqual(history.get_status({'error': 'x'}), 'error')
+        self.assertEqual(history.get_status({'skipped': 'up-to-date'}),
+                         'skipped')
+        self.assertEqual(history.get_status({}), 'ok')
@@ -1,6 +1,9 @@
+import gc
 import os
 import sys
 import six
+import shutil
+import tempfile
 from copy import deepcopy
 from collections import OrderedDict
 from unittest import TestCase
@@ -224,6 +227,13 @@ class TestKind(api.KindObject):
         return '$$$_test_task_$$$'
 
 
+class SlotKind(api.KindObject):
+    __slots__ = ()
+
+    def _test_task(self, **args):
+        return self.name
+
+
 class Package(TestCase):
     def setUp(self):
         self.r = api.Repository()
@@ -325,6 +335,44 @@ class Repository(TestCase):
         self.repo.remove(thing)
         self.assertNotIn('test2.TestKind/muhthing', self.repo)
 
+    def test_remove_package(self):
+        test_package = get_test_package()
+        self.repo.add_package(test_package)
+        self.repo.add(get_test_object('test2', 'TestKind', 'muhthing'))
+        self.repo.add(get_test_object('test2', 'TestKind', 'muhthing2'))
+        self.repo.remove_package(self.repo.get_package('test2'))
+        self.assertEqual(len(self.repo['test2.TestKind']), 0)
+
+    def test_dependents(self):
+        self.assertListEqual(self.repo.dependents('test.Directory/web'),
+                             ['test.App/web'])
+        self.assertListEqual(
+            self.repo.dependents('test.Directory/web', transitive=True),
+            ['test.App/web', 'test.RegionApp/r1_web',
+             'test.RegionApp/r2_web'])
+        self.assertListEqual(
+            self.repo.dependents('test.Region/r1'),
+            ['test.RegionApp/r1_web', 'test.RegionApp/r1_api'])
+
+    def test_dependents_updated(self):
+        self.repo.remove(self.repo['test.RegionApp/r1_web'])
+        self.assertListEqual(self.repo.dependents('test.Region/r1'),
+                             ['test.RegionApp/r1_api'])
+        self.repo['test.RegionApp/r1_api']['region'] = 'r2'
+        self.assertListEqual(self.repo.dependents('test.Region/r1'), [])
+        self.assertListEqual(
+            self.repo.dependents('test.Region/r2'),
+            ['test.RegionApp/r2_web', 'test.RegionApp/r2_api',
+             'test.RegionApp/r1_api'])
+
+    def test_impact(self):
+        res = self.repo.impact('test.App/api')
+        self.assertEqual(res['ref'], 'test.App/api')
+        self.assertListEqual(res['direct'], [
+            'test.RegionApp/r1_api', 'test.RegionApp/r2_api'])
+        with self.assertRaises(api.UnknownKindObjectException):
+            self.repo.impact('test.App/missing')
+
     def test_invoke_kind_task(self):
         data = self.repo.invoke_kind_task(
             'test.Region', 'r1', 'login', None)
@@ -338,6 +386,171 @@ class Repository(TestCase):
         with self.assertRaises(api.DuplicateKindObjectException):
             self.repo.load_file(fn)
 
+    def test_load_file_progress(self):
+        fn = os.path.dirname(os.path.abspath(__file__))
+        fn = os.path.join(fn, 'objects-example', 'objects.yml')
+        counts = []
+        repo = api.Repository()
+        repo.load_packages_file(fn, '../objects-example/kinds.yml')
+        repo.load_file(fn, progress=counts.append)
+        self.assertListEqual(counts, [1])
+        self.assertIn('test.Region/r1', repo)
+
+    def test_load_file_jobs(self):
+        dirname = tempfile.mkdtemp()
+        try:
+            for i in range(4):
+                sub = os.path.join(dirname, 'd{0}'.format(i % 2))
+                if not os.path.isdir(sub):
+                    os.makedirs(sub)
+                with open(os.path.join(sub, '{0}.yml'.format(i)), 'w') as f:
+                    f.write(yamlutil.dump_dict([
+                        get_test_object(tag='t{0}_{1}'.format(i, j))
+                        for j in range(3)]))
+            serial = api.read_packages(dirname)
+            parallel = api.read_packages(dirname, jobs=2)
+            self.assertListEqual(serial, parallel)
+            self.assertListEqual([o['tag'] for o in serial[:4]],
+                                 ['t0_0', 't0_1', 't0_2', 't2_0'])
+            self.repo.add_package(get_test_package())
+            self.repo.load_file(dirname, jobs=2)
+            self.assertEqual(len(self.repo['test2.TestKind']), 12)
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_reload(self):
+        dirname = tempfile.mkdtemp()
+        fn = os.path.join(dirname, 'objects.yml')
+
+        def write(*objs):
+            with open(fn, 'w') as f:
+                f.write(yamlutil.dump_dict(list(objs)))
+
+        try:
+            self.repo.add_package(get_test_package())
+            write(get_test_object(tag='a', labels=['x']),
+                  get_test_object(tag='b', labels=['x']),
+                  get_test_object(tag='c'))
+            self.repo.load_file(fn)
+            self.assertEqual(self.repo.get_source(
+                self.repo['test2.TestKind/a']), fn)
+            write(get_test_object(tag='a', labels=['x']),
+                  get_test_object(tag='c', labels=['x'], name='changed'),
+                  get_test_object(tag='d'))
+            changes = self.repo.reload(fn)
+            self.assertListEqual(changes['added'], ['test2.TestKind/d'])
+            self.assertListEqual(changes['removed'], ['test2.TestKind/b'])
+            self.assertListEqual(changes['updated'], ['test2.TestKind/c'])
+            kobjs = self.repo['test2.TestKind']
+            self.assertListEqual([o.tag for o in kobjs], ['a', 'c', 'd'])
+            self.assertEqual(kobjs['c'].name, 'changed')
+            self.assertListEqual(
+                list(kobjs.query_labels(['x'], tag=True)), ['a', 'c'])
+            os.remove(fn)
+            changes = self.repo.reload([fn])
+            self.assertEqual(len(changes['removed']), 3)
+            self.assertEqual(len(kobjs), 0)
+            self.assertNotIn(fn, self.repo.sources)
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_reload_move(self):
+        dirname = tempfile.mkdtemp()
+        a = os.path.join(dirname, 'a.yml')
+        b = os.path.join(dirname, 'b.yml')
+
+        def write(fn, *objs):
+            with open(fn, 'w') as f:
+                f.write(yamlutil.dump_dict(list(objs)))
+
+        try:
+            self.repo.add_package(get_test_package())
+            write(a, get_test_object(tag='x'), get_test_object(tag='y'))
+            write(b, get_test_object(tag='z'))
+            self.repo.load_file(a)
+            self.repo.load_file(b)
+            write(a, get_test_object(tag='y'))
+            write(b, get_test_object(tag='z'),
+                  get_test_object(tag='x', name='moved'))
+            changes = self.repo.reload([a, b])
+            self.assertListEqual(changes['moved'], ['test2.TestKind/x'])
+            self.assertListEqual(changes['updated'], ['test2.TestKind/x'])
+            self.assertListEqual(changes['removed'], [])
+            x = self.repo['test2.TestKind/x']
+            self.assertEqual(x.name, 'moved')
+            self.assertEqual(self.repo.get_source(x), b)
+            os.remove(a)
+            write(b, get_test_object(tag='x', name='moved'),
+                  get_test_object(tag='y'))
+            changes = self.repo.reload([b])
+            self.assertListEqual(changes['moved'], ['test2.TestKind/y'])
+            self.assertListEqual(changes['removed'], ['test2.TestKind/z'])
+            self.assertEqual(self.repo.get_source(
+                self.repo['test2.TestKind/y']), b)
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_reload_duplicate(self):
+        dirname = tempfile.mkdtemp()
+        a = os.path.join(dirname, 'a.yml')
+        b = os.path.join(dirname, 'b.yml')
+
+        def write(fn, *objs):
+            with open(fn, 'w') as f:
+                f.write(yamlutil.dump_dict(list(objs)))
+
+        try:
+            self.repo.add_package(get_test_package())
+            write(a, get_test_object(tag='x'))
+            write(b, get_test_object(tag='y'))
+            self.repo.load_file(a)
+            self.repo.load_file(b)
+            write(b, get_test_object(tag='y'),
+                  get_test_object(tag='x', name='copy'))
+            with self.assertRaises(api.DuplicateKindObjectException):
+                self.repo.reload([b])
+            x = self.repo['test2.TestKind/x']
+            self.assertNotEqual(x.name, 'copy')
+            self.assertEqual(self.repo.get_source(x), a)
+            self.repo.add(get_test_object(tag='w'))
+            write(b, get_test_object(tag='y'), get_test_object(tag='w'))
+            with self.assertRaises(api.DuplicateKindObjectException):
+                self.repo.reload([b])
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_reload_invalid(self):
+        dirname = tempfile.mkdtemp()
+        a = os.path.join(dirname, 'a.yml')
+        b = os.path.join(dirname, 'b.yml')
+
+        def write(fn, *objs):
+            with open(fn, 'w') as f:
+                f.write(yamlutil.dump_dict(list(objs)))
+
+        try:
+            self.repo.add_package(get_test_package())
+            write(a, get_test_object(tag='x'))
+            write(b, get_test_object(tag='y'))
+            self.repo.load_file(a)
+            self.repo.load_file(b)
+            write(a, get_test_object(tag='w'))
+            write(b, {'kind': 'test2.Unknown', 'tag': 'y'})
+            with self.assertRaises(api.PyautoException):
+                self.repo.reload([a, b])
+            self.assertListEqual([o.tag for o in self.repo['test2.TestKind']],
+                                 ['x', 'y'])
+            self.assertEqual(self.repo.get_source(
+                self.repo['test2.TestKind/x']), a)
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_load_objects_copy(self):
+        obj = get_test_object()
+        self.repo.add_package(get_test_package())
+        self.repo.load_objects([obj], copy=False)
+        self.assertIs(self.repo['test2.TestKind/muhthing'].data, obj)
+
 
 class Reference(TestCase):
     def test_init(self):
@@ -492,6 +705,98 @@ class Kind(TestCase):
         pass
 
 
+class KindSlots(TestCase):
+    def setUp(self):
+        self.r = api.Repository()
+        self.r.add_package(get_test_package())
+        self.r.add_package({
+            'package': 'test3',
+            'kinds': [{
+                'kind': kind,
+                'configs': 'test.test_objects.SlotKind',
+                'slots': kind == 'SlotKind',
+                'attributes': {'name': 'string', 'count': 'int optional'},
+                'relations': {'source': 'test2.TestKind optional'},
+                'tasks': ['_test_task'],
+            } for kind in ['SlotKind', 'TestKind']],
+        })
+        self.r.add(get_test_object())
+        self.obj = self.r.add(get_test_object(
+            'test3', 'SlotKind', 'slotted', source='muhthing', count='3'))
+
+    def measure(self, kind_name, prefix, count=2000):
+        try:
+            import tracemalloc
+        except ImportError:
+            self.skipTest('tracemalloc is not available')
+        gc.collect()
+        tracemalloc.start()
+        try:
+            objs = [get_test_object(*kind_name.split('.'),
+                                    tag=prefix + str(i))
+                    for i in range(count)]
+            self.r.load_objects(objs, copy=False)
+            del objs
+            gc.collect()
+            return tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    def test_class(self):
+        kind = self.r.get_kind('test3.SlotKind')
+        self.assertIsNot(kind.object_class, kind.config_class)
+        self.assertIsInstance(self.obj, SlotKind)
+        self.assertIs(self.r.get_kind('test3.TestKind').object_class,
+                      SlotKind)
+        with self.assertRaises(AttributeError):
+            object.__getattribute__(self.obj, '__dict__')
+
+    def test_memory(self):
+        self.measure('test3.TestKind', 'warmup', 10)
+        self.assertLess(self.measure('test3.SlotKind', 'm'),
+                        self.measure('test3.TestKind', 'm') * 0.8)
+
+    def test_attributes(self):
+        self.assertEqual(self.obj.name, 'sumpthun')
+        self.assertEqual(self.obj.count, 3)
+        self.assertEqual(self.obj['count'], 3)
+        self.obj['count'] = '4'
+        self.assertEqual(self.obj.count, 4)
+        self.assertEqual(self.obj.source.tag, 'muhthing')
+        self.obj['other'] = 'extra'
+        self.assertEqual(self.obj.other, 'extra')
+
+    def test_optional(self):
+        data = get_test_object('test3', 'SlotKind', 'empty')
+        del data['source']
+        obj = self.r.add(data)
+        self.assertIsNone(obj.count)
+        self.assertIsNone(obj.source)
+        self.assertNotIn('count', obj.data)
+
+    def test_data(self):
+        self.assertEqual(self.obj.data, OrderedDict([
+            ('kind', 'test3.SlotKind'), ('tag', 'slotted'), ('labels', []),
+            ('name', 'sumpthun'), ('count', '3'), ('source', 'muhthing')]))
+        self.assertListEqual(list(self.obj)[-1:], ['source'])
+        self.assertEqual(self.obj.dump()['count'], '3')
+        self.obj['other'] = 'extra'
+        self.assertEqual(self.obj.data['other'], 'extra')
+
+    def test_relations(self):
+        self.assertListEqual(self.r.dependents('test2.TestKind/muhthing'),
+                             ['test3.SlotKind/slotted'])
+        self.r.add(get_test_object(tag='other'))
+        self.obj['source'] = 'other'
+        self.assertListEqual(self.r.dependents('test2.TestKind/other'),
+                             ['test3.SlotKind/slotted'])
+        self.assertEqual(self.obj.source.tag, 'other')
+
+    def test_invoke(self):
+        res = self.r.invoke('test3.SlotKind._test_task', 'slotted', None)
+        self.assertEqual(res['result'], 'sumpthun')
+
+
 class KindTasks(TestCase):
     def setUp(self):
         test_package = get_test_package()
@@ -596,6 +901,40 @@ class KindObjects(TestCase):
         else:
             raise api.PyautoException('object not found')
 
+    def test_query_tags(self):
+        for tag in ['muhthing', 'muhthing2', 'muhthing3']:
+            self.r.add(get_test_object(tag=tag))
+        res = self.kobjs.query_tags(['muhthing3', 'missing', 'muhthing'],
+                                    tag=True)
+        self.assertListEqual(list(res), ['muhthing', 'muhthing3'])
+        self.kobjs.remove(self.kobjs['muhthing'])
+        self.r.add(get_test_object(tag='muhthing'))
+        res = self.kobjs.query_tags(['muhthing', 'muhthing3', 'muhthing2'],
+                                    tag=True)
+        self.assertListEqual(list(res), ['muhthing2', 'muhthing3', 'muhthing'])
+
+    def test_query_tags_invalid(self):
+        with self.assertRaises(api.InvalidQueryException):
+            list(self.kobjs.query({'tags': [['muhthing']]}))
+
+    def test_query_selector(self):
+        self.r.add(get_test_object(tag='a', labels=['x', 'y']))
+        self.r.add(get_test_object(tag='b', labels=['x']))
+        self.r.add(get_test_object(tag='c', labels=['y', 'z']))
+        self.r.add(get_test_object(tag='d', labels=[]))
+
+        def query(selector):
+            return list(self.kobjs.query({'labels': selector}, tag=True))
+
+        self.assertListEqual(query({'any': ['y', 'x']}), ['a', 'c', 'b'])
+        self.assertListEqual(query({'all': ['x', 'y']}), ['a'])
+        self.assertListEqual(query({'all': ['x'], 'not': 'y'}), ['b'])
+        self.assertListEqual(query({'any': ['x', 'z'], 'not': ['y']}), ['b'])
+        self.assertListEqual(query({'not': ['x']}), ['c', 'd'])
+        self.assertListEqual(query({'all': ['x', 'missing']}), [])
+        with self.assertRaises(api.InvalidQueryException):
+            query({'some': ['x']})
+
     def test_remove(self):
         test_object = get_test_object()
         self.r.add(test_object)
@@ -603,6 +942,16 @@ class KindObjects(TestCase):
         self.r.remove(obj)
         self.assertNotIn('muhthing', self.kobjs)
 
+    def test_remove_labels(self):
+        for tag in ['a', 'b', 'c']:
+            self.r.add(get_test_object(tag=tag, labels=['x']))
+        self.r.remove(self.kobjs['b'])
+        self.assertListEqual(
+            list(self.kobjs.query_labels(['x'], tag=True)), ['a', 'c'])
+        self.r.remove(self.kobjs['a'])
+        self.r.remove(self.kobjs['c'])
+        self.assertNotIn('x', self.kobjs._labels)
+
     def test_getitem(self):
         test_object = get_test_object()
         self.r.add(test_object)
@@ -664,6 +1013,38 @@ class KindObject(TestCase):
         self.obj['key'] = 'abc'
         self.assertEqual(self.obj._data['key'], 'abc')
 
+    def test_get_cached(self):
+        self.assertIs(self.obj._get_cache(), self.obj._get_cache())
+        self.assertEqual(self.obj.name, 'sumpthun')
+        self.assertIn('name', self.obj._cache)
+        self.obj['name'] = 'other'
+        self.assertEqual(self.obj.name, 'other')
+
+    def test_get_cached_relation(self):
+        ok2 = get_test_package('test3', relations={'source': 'test2.TestKind'})
+        self.r.add_package(ok2)
+        obj2 = self.r.add(get_test_object('test3', 'TestKind', 'muhthing2',
+                                          source='muhthing'))
+        self.assertIs(obj2.source, obj2.source)
+        self.assertIs(obj2.source.value, self.obj)
+        self.r.remove(self.obj)
+        self.r.add(get_test_object(name='replaced'))
+        self.assertEqual(obj2.source.name, 'replaced')
+
+    def test_get_nocache(self):
+        pkg = get_test_package('test3', attributes={
+            'home': 'envvar nocache', 'name': 'string'})
+        self.r.add_package(pkg)
+        obj = self.r.add(get_test_object(
+            'test3', 'TestKind', 'env', home='PYAUTO_TEST_HOME'))
+        os.environ['PYAUTO_TEST_HOME'] = 'a'
+        self.assertEqual(obj.home, 'a')
+        os.environ['PYAUTO_TEST_HOME'] = 'b'
+        self.assertEqual(obj.home, 'b')
+        self.assertEqual(obj.name, 'sumpthun')
+        self.assertNotIn('home', obj._cache)
+        del os.environ['PYAUTO_TEST_HOME']
+
 
 class RelationList(TestCase):
     def setUp(self):
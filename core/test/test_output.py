@@ -0,0 +1,79 @@
+import json
+from six import StringIO
+from unittest import TestCase
+from collections import OrderedDict
+from pyauto.core import api, output
+from pyauto.util import yamlutil
+
+
+documents = [
+    OrderedDict([('kind', 'file.File'), ('tag', 'a'), ('labels', ['x', 'y'])]),
+    OrderedDict([
+        ('plain', 'a b/c.d-e_f@g'),
+        ('quoted', ['yes', 'null', '1', '1.5', '.inf', 'a: b', 'a #b', '',
+                    ' a', 'a ', '- a', '*a', '&a', '!a', '%a', '{a}',
+                    'line\nline', u'caf\xe9', '"q"', "'q'"]),
+        ('numbers', [0, -1, 1.5, -0.25, 1e-05, 1e+300, float('inf')]),
+        ('consts', [True, False, None]),
+        ('empty', [[], {}, OrderedDict()]),
+        ('nested', [[1, [2, 3]], OrderedDict([
+            ('a', OrderedDict([('b', [OrderedDict([('c', 1), ('d', [])])])])),
+            ('e', 2)])]),
+        ('', 'empty key'),
+        (u'caf\xe9', 'unicode key'),
+    ]),
+    ['a', OrderedDict([('b', 1)])],
+    'scalar',
+    OrderedDict(),
+    OrderedDict([(1, 'int key')]),
+]
+
+
+class RenderYaml(TestCase):
+    def test_round_trip(self):
+        text = output.render_documents('yaml', documents)
+        res = list(yamlutil.load_dict(text, load_all=True))
+        self.assertEqual(res, documents)
+
+    def test_block_style(self):
+        self.assertEqual(output.render_yaml(documents[0]),
+                         '---\nkind: file.File\ntag: a\nlabels:\n- x\n- "y"\n')
+
+    def test_scalar(self):
+        self.assertEqual(output.render_scalar('abc'), 'abc')
+        self.assertEqual(output.render_scalar('yes'), '"yes"')
+        self.assertEqual(output.render_scalar(1.5), '1.5')
+        with self.assertRaises(output.UnsupportedValue):
+            output.render_scalar(object())
+
+
+class OutputWriter(TestCase):
+    def test_batches(self):
+        f = StringIO()
+        out = output.OutputWriter(f, 'jsonl', batch_size=2, interval=60)
+        out.write({'a': 1})
+        self.assertEqual(f.getvalue(), '')
+        out.write({'a': 2})
+        self.assertEqual(len(f.getvalue().splitlines()), 2)
+        out.write({'a': 3})
+        out.close()
+        self.assertListEqual([json.loads(l)['a'] for l in
+                              f.getvalue().splitlines()], [1, 2, 3])
+
+    def test_write_text(self):
+        f = StringIO()
+        with output.OutputWriter(f, 'yaml', interval=60) as out:
+            out.write({'a': 1})
+            out.write_text('text')
+        self.assertEqual(f.getvalue(), '---\na: 1\ntext\n')
+
+    def test_formats(self):
+        for format in output.formats:
+            f = StringIO()
+            with output.OutputWriter(f, format) as out:
+                out.write({'a': 1})
+            self.assertIn('a', f.getvalue())
+
+    def test_invalid_format(self):
+        with self.assertRaises(api.PyautoException):
+            output.OutputWriter(StringIO(), 'xml')
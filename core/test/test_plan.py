@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+from six import StringIO
+from unittest import TestCase
+from pyauto.core import api, taskapi, plan, executor
+from . import data
+
+
+def get_repository():
+    r = api.Repository()
+    r.load_packages(data.packages)
+    r.load_objects(data.objects)
+    return r
+
+
+def get_steps():
+    sequences = taskapi.TaskSequences(data.sequences)
+    return sequences.resolve_steps(get_repository(), data.query, 'deploy_app')
+
+
+class Plan(TestCase):
+    def write(self, steps, fingerprint='abc'):
+        f = StringIO()
+        plan.write_plan(f, steps, fingerprint, sequence='deploy_app')
+        f.seek(0)
+        return f
+
+    def test_round_trip(self):
+        steps = get_steps()
+        header, res = plan.read_plan(self.write(steps), 'abc')
+        self.assertEqual(header['version'], plan.version)
+        self.assertEqual(header['sequence'], 'deploy_app')
+        self.assertListEqual(res, steps)
+
+    def test_stale(self):
+        with self.assertRaises(plan.StalePlanException):
+            plan.read_plan(self.write(get_steps()), 'def')
+
+    def test_invalid(self):
+        with self.assertRaises(plan.InvalidPlanException):
+            plan.read_plan(StringIO(''))
+        with self.assertRaises(plan.InvalidPlanException):
+            plan.read_plan(StringIO('{"version": 0}\n'))
+
+    def test_run(self):
+        _, steps = plan.read_plan(self.write(get_steps()))
+        res = list(taskapi.run_steps(get_repository(), steps, jobs=2))
+        self.assertEqual(len(res), 39)
+
+    def test_fingerprint(self):
+        dirname = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(dirname, 'objects.yml')
+            with open(filename, 'w') as f:
+                f.write('a')
+            first = plan.fingerprint(filename, None)
+            os.utime(filename, (0, 0))
+            self.assertEqual(first, plan.fingerprint(filename))
+            with open(filename, 'w') as f:
+                f.write('b')
+            self.assertNotEqual(first, plan.fingerprint(filename))
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_fingerprint_boundaries(self):
+        dirname = tempfile.mkdtemp()
+        try:
+            a = os.path.join(dirname, 'a.yml')
+            b = os.path.join(dirname, 'b.yml')
+            for filename, data in [(a, 'ab'), (b, '')]:
+                with open(filename, 'w') as f:
+                    f.write(data)
+            first = plan.fingerprint(a, b)
+            for filename, data in [(a, 'a'), (b, 'b')]:
+                with open(filename, 'w') as f:
+                    f.write(data)
+            self.assertNotEqual(first, plan.fingerprint(a, b))
+            self.assertNotEqual(plan.fingerprint(a, b),
+                                plan.fingerprint(b, a))
+            self.assertNotEqual(plan.fingerprint(a, None, b),
+                                plan.fingerprint(a, b))
+        finally:
+            shutil.rmtree(dirname)
+
+
+class Shard(TestCase):
+    def test_parse_shard(self):
+        self.assertEqual(plan.parse_shard('2/3'), (2, 3))
+        for shard in ['0/3', '4/3', 'a/b', '1']:
+            with self.assertRaises(plan.InvalidPlanException):
+                plan.parse_shard(shard)
+
+    def test_components(self):
+        graph = executor.TaskGraph(get_steps())
+        self.assertEqual(len(plan.get_components(graph)), 3)
+
+    def test_shard_steps(self):
+        steps = get_steps()
+        shards = [plan.shard_steps(steps, i, 3) for i in range(1, 4)]
+        self.assertListEqual(sorted(len(s) for s in shards), [13, 13, 13])
+        self.assertEqual(sum(len(s) for s in shards), len(steps))
+        for shard in shards:
+            tags = set(step.tag[:4] for step in shard)
+            self.assertEqual(len(tags), 1)
+            self.assertListEqual(
+                shard, [step for step in steps if step in shard])
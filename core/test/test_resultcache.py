@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+from pyauto.core import api, resultcache
+
+
+class Counter(api.KindObject):
+    calls = []
+
+    def count(self, step=1):
+        Counter.calls.append((self.tag, step))
+        return len(Counter.calls)
+
+    def peek(self):
+        Counter.calls.append((self.tag, None))
+        return len(Counter.calls)
+
+    def lock(self):
+        Counter.calls.append((self.tag, 'lock'))
+        return {'lock': threading.Lock()}
+
+
+counter_packages = """
+package: count
+version: 0.0.0
+kinds:
+  - kind: Counter
+    configs: test.test_resultcache.Counter
+    relations:
+      parent: Counter optional
+    tasks:
+      - count: {cache: true}
+      - lock: {cache: true}
+      - peek
+"""
+
+counter_objects = """
+---
+kind: count.Counter
+tag: a
+---
+kind: count.Counter
+tag: b
+parent: a
+"""
+
+
+class ResultCache(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.cache = resultcache.ResultCache(
+            os.path.join(self.dirname, 'cache', 'results.sqlite'), size=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', {'result': 1})
+        self.assertDictEqual(self.cache.get('a'), {'result': 1})
+
+    def test_key(self):
+        key = self.cache.key('t', 'k/a', 'abc', {'x': 1, 'y': 2})
+        self.assertEqual(key, self.cache.key('t', 'k/a', 'abc',
+                                             {'y': 2, 'x': 1}))
+        self.assertNotEqual(key, self.cache.key('t', 'k/a', 'abd',
+                                                {'x': 1, 'y': 2}))
+
+    def test_eviction(self):
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.cache.get('a')
+        self.cache.put('c', 3)
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('c'), 3)
+
+    def test_clear(self):
+        self.cache.put('a', 1)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_unpicklable(self):
+        value = {'result': threading.Lock()}
+        self.assertIs(self.cache.put('a', value), value)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(len(self.cache), 0)
+
+
+class RepositoryResultCache(TestCase):
+    def setUp(self):
+        Counter.calls = []
+        self.dirname = tempfile.mkdtemp()
+        self.repo = api.Repository()
+        self.repo.load_packages([api.yamlutil.load_dict(counter_packages)])
+        self.repo.parse_objects(counter_objects)
+        self.repo.set_result_cache(resultcache.ResultCache(
+            os.path.join(self.dirname, 'results.sqlite')))
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_cacheable(self):
+        tasks = self.repo['count.Counter'].kind.tasks
+        self.assertTrue(tasks['count'].cacheable)
+        self.assertFalse(tasks['peek'].cacheable)
+
+    def test_invalid_option(self):
+        with self.assertRaises(api.InvalidKindObjectTaskException):
+            api.Repository().load_packages([api.yamlutil.load_dict(
+                counter_packages.replace('cache: true', 'bogus: true'))])
+
+    def test_cached(self):
+        first = self.repo.invoke('count.Counter.count', 'a', {})
+        second = self.repo.invoke('count.Counter.count', 'a', {})
+        self.assertEqual(len(Counter.calls), 1)
+        self.assertEqual(first['result'], second['result'])
+        self.assertNotIn('cached', first)
+        self.assertTrue(second['cached'])
+
+    def test_not_cacheable(self):
+        self.repo.invoke('count.Counter.peek', 'a', {})
+        self.repo.invoke('count.Counter.peek', 'a', {})
+        self.assertEqual(len(Counter.calls), 2)
+
+    def test_args(self):
+        self.repo.invoke('count.Counter.count', 'a', {'step': 1})
+        self.repo.invoke('count.Counter.count', 'a', {'step': 2})
+        self.repo.invoke('count.Counter.count', 'a', {'step': 2})
+        self.assertListEqual(Counter.calls, [('a', 1), ('a', 2)])
+
+    def test_relation_changed(self):
+        self.repo.invoke('count.Counter.count', 'b', {})
+        self.repo.invoke('count.Counter.count', 'b', {})
+        self.assertEqual(len(Counter.calls), 1)
+        self.repo['count.Counter/a'].data['labels'] = ['changed']
+        self.repo.invoke('count.Counter.count', 'b', {})
+        self.assertEqual(len(Counter.calls), 2)
+
+    def test_unpicklable(self):
+        first = self.repo.invoke('count.Counter.lock', 'a', {})
+        self.repo.invoke('count.Counter.lock', 'a', {})
+        self.assertEqual(len(Counter.calls), 2)
+        self.assertNotIn('error', first)
+
+    def test_disabled(self):
+        self.repo.set_result_cache(None)
+        self.repo.invoke('count.Counter.count', 'a', {})
+        self.repo.invoke('count.Counter.count', 'a', {})
+        self.assertEqual(len(Counter.calls), 2)
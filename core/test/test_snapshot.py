@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from pyauto.core import snapshot
+
+
+class Fingerprint(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, 'objects.yml')
+        with open(self.filename, 'w') as f:
+            f.write('kind: test.Region\ntag: r1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_fingerprint_file(self):
+        path, mtime, size, digest = snapshot.fingerprint_file(self.filename)
+        self.assertEqual(path, self.filename)
+        self.assertEqual(size, os.stat(self.filename).st_size)
+        self.assertEqual(len(digest), 40)
+
+    def test_fingerprint_dir(self):
+        with open(os.path.join(self.dirname, 'a.yml'), 'w') as f:
+            f.write('{}')
+        res = snapshot.fingerprint(self.dirname, None)
+        self.assertListEqual([os.path.basename(r[0]) for r in res],
+                             ['a.yml', 'objects.yml'])
+
+    def test_fingerprint_changed(self):
+        before = snapshot.fingerprint(self.filename)
+        with open(self.filename, 'a') as f:
+            f.write('labels: [abc]\n')
+        self.assertNotEqual(before, snapshot.fingerprint(self.filename))
+
+
+class Snapshot(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.snapshot = snapshot.Snapshot(
+            os.path.join(self.dirname, 'cache', 'snapshot.pickle'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_load_missing(self):
+        self.assertIsNone(self.snapshot.load('key'))
+
+    def test_save_load(self):
+        self.snapshot.save('key', {'objects': [1, 2]})
+        self.assertDictEqual(self.snapshot.load('key'), {'objects': [1, 2]})
+        self.assertIsNone(self.snapshot.load('other'))
+
+    def test_load_corrupt(self):
+        self.snapshot.save('key', 1)
+        with open(self.snapshot.filename, 'wb') as f:
+            f.write(b'garbage')
+        self.assertIsNone(self.snapshot.load('key'))
+
+    def test_get(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return 'value'
+
+        self.assertEqual(self.snapshot.get('key', build), 'value')
+        self.assertEqual(self.snapshot.get('key', build), 'value')
+        self.assertEqual(len(calls), 1)
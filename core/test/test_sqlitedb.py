@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+from pyauto.core import sqlitedb
+
+
+class Items(sqlitedb.Store):
+    schema = ['CREATE TABLE IF NOT EXISTS items (name TEXT)']
+
+
+class Store(TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.store = Items(os.path.join(self.dirname, 'ws', 'items.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_schema(self):
+        conn = self.store.connect()
+        conn.execute("INSERT INTO items VALUES ('a')")
+        conn.commit()
+        self.assertIs(self.store.connect(), conn)
+        self.assertTrue(os.path.isfile(self.store.filename))
+
+    def test_threads(self):
+        conns = []
+        thread = threading.Thread(
+            target=lambda: conns.append(self.store.connect()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(self.store.connect(), conns[0])
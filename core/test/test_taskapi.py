@@ -1,8 +1,10 @@
 import json
+import time
 from pyauto.util import yamlutil
 from pyauto.core import api, taskapi
 from unittest import TestCase
 from collections import OrderedDict
+from copy import deepcopy
 from . import data
 
 
@@ -28,6 +30,55 @@ class General(TestCase):
         self.assertEqual(res[0], 'file.File.render_template')
         self.assertEqual(res[1], 'abc1')
         self.assertDictEqual(res[2], {'a': 1, 'b': 2})
+        res = taskapi.parse_task(
+            'file.File.render_template abc1 {"a":[1,2]}')
+        self.assertDictEqual(res[2], {'a': [1, 2]})
+
+    def test_parse_task_invalid(self):
+        with self.assertRaises(taskapi.InvalidTaskSequence):
+            taskapi.parse_task('file.File.render_template abc1 {a: 1}')
+
+    def test_get_task_step(self):
+        step = taskapi.get_task_step('file.File.render_template abc1')
+        self.assertEqual(step.taskref, 'file.File.render_template')
+        self.assertEqual(step.tag, 'abc1')
+        self.assertDictEqual(step.args, {})
+
+    def test_static_args(self):
+        subtask = taskapi.SubTaskSequence(
+            None, {'task': 'a.B.c {{tag}} {"x":[1]}'})
+        first = subtask.get_step(subtask.render(tag='t1'))
+        second = subtask.get_step(subtask.render(tag='t2'))
+        self.assertEqual(second.tag, 't2')
+        self.assertDictEqual(first.args, {'x': [1]})
+        self.assertIsNot(first.args, second.args)
+        self.assertIs(first.args['x'], second.args['x'])
+
+    def test_dynamic_args(self):
+        subtask = taskapi.SubTaskSequence(
+            None, {'task': 'a.B.c t \'{"x": {{value}}}\''})
+        step = subtask.get_step(subtask.render(value='1'))
+        self.assertDictEqual(step.args, {'x': 1})
+        step = subtask.get_step(subtask.render(value='2'))
+        self.assertDictEqual(step.args, {'x': 2})
+
+    def test_resolve_without_args(self):
+        tasks = deepcopy(data.sequences)
+        tasks['sequences']['region_login']['region'] = [
+            {'task': 'deploy.Region.login {{reg.tag}} {"a":"{{reg.tag}}"}'}]
+        parse_task_args = taskapi.parse_task_args
+
+        def fail(args):
+            raise AssertionError('args parsed: {0}'.format(args))
+
+        taskapi.parse_task_args = fail
+        try:
+            res = taskapi.TaskSequences(tasks).resolve(
+                get_repository(), {'reg': {'labels': ['abc']}},
+                'region_login')
+        finally:
+            taskapi.parse_task_args = parse_task_args
+        self.assertEqual(res[0], 'deploy.Region.login abc1 {"a":"abc1"}')
 
 
 class TaskSequenceArguments(TestCase):
@@ -59,6 +110,121 @@ class TaskSequenceArguments(TestCase):
             {'app': 'b', 'reg': 'd'}])
 
 
+class Obj(object):
+    def __init__(self, tag, **data):
+        self.tag = tag
+        self.data = data
+
+
+class TaskSequenceJoins(TestCase):
+    def setUp(self):
+        self.regs = [Obj('r1'), Obj('r2'), Obj('r3')]
+        self.apps = [Obj('a', region=['r1', 'r3']), Obj('b', region='r2'),
+                     Obj('c')]
+        self.results = {'deploy.Region': self.regs, 'deploy.App': self.apps,
+                        'deploy.RegionApp': [Obj('r2_a'), Obj('r1_a'),
+                                             Obj('r1_c'), Obj('r9_a')]}
+
+    def build(self, *joins):
+        args = taskapi.TaskSequenceArguments('app', OrderedDict([
+            ('reg', 'deploy.Region'), ('app', 'deploy.App'),
+            ('__join__', list(joins))]))
+        return [(c['reg'].tag, c['app'].tag)
+                for c in args.build_context(self.results)]
+
+    def test_spec(self):
+        args = taskapi.TaskSequenceArguments('app', {
+            'reg': 'deploy.Region',
+            '__join__': [{'kind': 'deploy.RegionApp', 'tag': '{reg}_x'}]})
+        self.assertListEqual(args.kinds, ['deploy.Region'])
+        self.assertListEqual(args.join_kinds, ['deploy.RegionApp'])
+        self.assertFalse(args.has_variable('__join__'))
+
+    def test_relation(self):
+        self.assertListEqual(
+            self.build({'relation': 'app.region', 'to': 'reg'}),
+            [('r1', 'a'), ('r2', 'b'), ('r3', 'a')])
+
+    def test_tag(self):
+        self.assertListEqual(
+            self.build({'kind': 'deploy.RegionApp', 'tag': '{reg}_{app}'}),
+            [('r1', 'a'), ('r1', 'c'), ('r2', 'a')])
+
+    def test_tag_overlapping(self):
+        self.results = {
+            'deploy.Region': [Obj('eu'), Obj('eu_west')],
+            'deploy.App': [Obj('west_api'), Obj('api')],
+            'deploy.RegionApp': [Obj('eu_west_api')]}
+        self.assertListEqual(
+            self.build({'kind': 'deploy.RegionApp', 'tag': '{reg}_{app}'}),
+            [('eu', 'west_api'), ('eu_west', 'api')])
+
+    def test_tag_repeated_variable(self):
+        self.results['deploy.RegionApp'] = [Obj('r1_a_r1'), Obj('r2_b_r1')]
+        join = {'kind': 'deploy.RegionApp', 'tag': '{reg}_{app}_{reg}'}
+        self.assertListEqual(self.build(join), [('r1', 'a')])
+
+    def test_tag_scaling(self):
+        count = 2000
+        self.results = {
+            'deploy.Region': [Obj('r{0}'.format(i)) for i in range(count)],
+            'deploy.App': [Obj('a{0}'.format(i)) for i in range(count)],
+            'deploy.RegionApp': [Obj('r{0}_a{0}'.format(i))
+                                 for i in range(count)]}
+        start = time.time()
+        res = self.build({'kind': 'deploy.RegionApp', 'tag': '{reg}_{app}'})
+        self.assertEqual(len(res), count)
+        self.assertEqual(res[-1], ('r1999', 'a1999'))
+        self.assertLess(time.time() - start, 2)
+
+    def test_tag_single_variable(self):
+        self.assertListEqual(
+            self.build({'kind': 'deploy.RegionApp', 'tag': '{reg}_a'}),
+            [('r1', 'a'), ('r1', 'b'), ('r1', 'c'),
+             ('r2', 'a'), ('r2', 'b'), ('r2', 'c')])
+
+    def test_both(self):
+        self.assertListEqual(
+            self.build({'kind': 'deploy.RegionApp', 'tag': '{reg}_{app}'},
+                       {'relation': 'app.region', 'to': 'reg'}),
+            [('r1', 'a')])
+
+    def test_lazy(self):
+        args = taskapi.TaskSequenceArguments('app', OrderedDict([
+            ('reg', 'deploy.Region'), ('app', 'deploy.App'),
+            ('__join__', [{'relation': 'app.region', 'to': 'reg'}])]))
+        context = args.build_context(self.results)
+        self.assertEqual(next(context)['app'].tag, 'a')
+
+    def test_invalid(self):
+        with self.assertRaises(taskapi.InvalidTaskSequence):
+            self.build({'relation': 'app.region', 'to': 'other'})
+        with self.assertRaises(taskapi.InvalidTaskSequence):
+            self.build({'relation': 'app', 'to': 'reg'})
+        with self.assertRaises(taskapi.InvalidTaskSequence):
+            self.build({'tag': '{reg}_{app}'})
+        with self.assertRaises(taskapi.InvalidTaskSequence):
+            self.build({'kind': 'deploy.RegionApp'})
+
+    def test_resolve(self):
+        tasks = deepcopy(data.sequences)
+        tasks['arguments']['application']['__join__'] = [
+            {'kind': 'deploy.RegionApp', 'tag': '{reg}_{app}'}]
+        repo = get_repository()
+        repo.remove(repo['deploy.RegionApp/abc2_b'])
+        res = taskapi.TaskSequences(tasks).resolve(
+            repo, data.query, 'push_app')
+        self.assertListEqual(res, [
+            'deploy.RegionApp.push_app abc1_a',
+            'deploy.RegionApp.push_app abc1_b',
+            'deploy.RegionApp.push_app abc1_c',
+            'deploy.RegionApp.push_app abc2_a',
+            'deploy.RegionApp.push_app abc2_c',
+            'deploy.RegionApp.push_app abc3_a',
+            'deploy.RegionApp.push_app abc3_b',
+            'deploy.RegionApp.push_app abc3_c'])
+
+
 class TaskSequenceQuery(TestCase):
     def setUp(self):
         self.sequences = get_task_sequences()
@@ -104,6 +270,33 @@ class TaskSequences(TestCase):
             {'reg': 'deploy.Region/abc3', 'app': 'deploy.App/b'},
             {'reg': 'deploy.Region/abc3', 'app': 'deploy.App/c'},])
 
+    def test_iter_steps(self):
+        steps = self.sequences.iter_steps(
+            self.repository, self.query_results, 'deploy_app')
+        self.assertNotIsInstance(steps, list)
+        self.assertEqual(next(steps).command, 'deploy.Region.login abc1')
+        self.assertEqual(len(list(steps)), 38)
+
+    def test_iter_steps_invalid(self):
+        with self.assertRaises(taskapi.InvalidTaskSequence):
+            self.sequences.iter_steps(
+                self.repository, self.query_results, 'missing')
+
+    def test_resolve_steps(self):
+        res = self.sequences.resolve_steps(
+            self.repository, self.query_results, 'deploy_app')
+        self.assertEqual(len(res), 39)
+        self.assertEqual(res[3].taskref, 'file.Directory.rmtree')
+        self.assertEqual(res[3].tag, 'abc1_a')
+        self.assertDictEqual(res[3].args, {})
+
+    def test_compiled_template(self):
+        subtask = self.sequences.get_sequence('deploy_app').sequence[0]
+        subtask.render(reg={'tag': 'x'})
+        compiled = subtask._compiled
+        subtask.render(reg={'tag': 'y'})
+        self.assertIs(subtask._compiled, compiled)
+
     def test_resolve(self):
         res = self.sequences.resolve(
             self.repository, self.query_results, 'deploy_app')
@@ -184,6 +377,41 @@ class TaskSequences(TestCase):
             'deploy.RegionApp.push_app'])
 
 
+class TaskSequenceOnce(TestCase):
+    def get_sequences(self, once):
+        tasks = deepcopy(data.sequences)
+        tasks['sequences']['login_all'] = OrderedDict([
+            ('application', [
+                {'task': 'deploy.Region.login {{reg.tag}}'},
+                {'seq': 'region_login'},
+            ]),
+            ('once', once),
+        ])
+        return taskapi.TaskSequences(tasks)
+
+    def resolve(self, once):
+        return self.get_sequences(once).resolve(
+            get_repository(), data.query, 'login_all')
+
+    def test_once(self):
+        self.assertListEqual(self.resolve(True), [
+            'deploy.Region.login abc1',
+            'deploy.Region.login abc2',
+            'deploy.Region.login abc3'])
+
+    def test_not_once(self):
+        self.assertEqual(len(self.resolve(False)), 12)
+
+    def test_once_context(self):
+        steps = self.get_sequences(True).resolve_steps(
+            get_repository(), data.query, 'login_all')
+        self.assertEqual(dict(steps[0].context)['app'], 'deploy.App/a')
+
+    def test_invalid(self):
+        with self.assertRaises(taskapi.InvalidTaskSequence):
+            taskapi.TaskSequence(get_task_sequences(), {'once': True}, 'x')
+
+
 class TaskSequence(TestCase):
     def setUp(self):
         self.repository = get_repository()
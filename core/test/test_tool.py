@@ -1,5 +1,8 @@
 import os
+import json
 import sys
+import shutil
+import tempfile
 from unittest import TestCase
 from pyauto.core import tool, api
 from subprocess import Popen, PIPE
@@ -18,12 +21,12 @@ def login(region, **args):
     pass
 
 
-def run_tool(objects, tasks, kinds, cmd, *args):
+def run_tool(objects, tasks, kinds, *args):
     objects = os.path.join(example, objects)
     tasks = os.path.join(example, tasks)
     kinds = os.path.join(example, kinds)
     p = Popen(['python', '-m', 'pyauto.core.tool',
-               '-o', objects, '-t', tasks, '-p', kinds, cmd] + list(args),
+               '-o', objects, '-t', tasks, '-p', kinds] + list(args),
                stdout=PIPE, stderr=PIPE)
     stdout, stderr = p.communicate()
     print('STDERR:', stderr.decode('utf-8'))
@@ -35,6 +38,19 @@ class Region(api.KindObject):
     pass
 
 
+class RenderList(TestCase):
+    def test_json(self):
+        for format in ['json', 'prettyjson']:
+            for items in [[], ['a'], ['a', {'b': 1}]]:
+                res = '\n'.join(tool.render_list(format, iter(items)))
+                self.assertEqual(json.loads(res), items)
+
+    def test_yaml(self):
+        for items in [[], ['a'], ['a', 'b c']]:
+            res = '\n'.join(tool.render_list('yaml', iter(items)))
+            self.assertEqual(yamlutil.load_dict(res), items)
+
+
 class Cli(TestCase):
     def test_run_files(self):
         p = run_tool('objects.yml', 'tasks.yml', 'pkg.yml', 'run', '{reg:{tags:[r1]}}', 'regions_login')
@@ -44,7 +60,116 @@ class Cli(TestCase):
         p = run_tool('objects', 'tasks.yml', 'pkg.yml', 'run', '{reg:{tags:[r1]}}', 'regions_login')
         self.assertEqual(p.returncode, 0)
 
+    def test_run_dirs_parse_workers(self):
+        for option in ['-j', '--parse-workers']:
+            p = run_tool('objects', 'tasks.yml', 'pkg.yml', option, '2',
+                         'run', '{reg:{tags:[r1]}}', 'regions_login')
+            self.assertEqual(p.returncode, 0)
+
+    def test_impact(self):
+        p = run_tool('objects', 'tasks.yml', 'pkg.yml', 'impact',
+                     'test.Region/r1')
+        self.assertEqual(p.returncode, 0)
+
+    def test_run_jobs(self):
+        p = run_tool('objects', 'tasks.yml', 'pkg.yml', 'run',
+                     '{reg:{tags:[r1]}}', 'regions_login', '--jobs', '2')
+        self.assertEqual(p.returncode, 0)
+
+    def test_run_asyncio(self):
+        p = run_tool('objects', 'tasks.yml', 'pkg.yml', 'run',
+                     '{reg:{tags:[r1]}}', 'regions_login', '--asyncio',
+                     '--jobs', '2')
+        self.assertEqual(p.returncode, 0)
+
+    def test_run_cache(self):
+        workspace = tempfile.mkdtemp()
+        try:
+            p = run_tool('objects', 'tasks.yml', 'pkg.yml', '-w', workspace,
+                         '--cache', 'run', '{reg:{tags:[r1]}}',
+                         'regions_login')
+            self.assertEqual(p.returncode, 0)
+        finally:
+            shutil.rmtree(workspace)
+
+    def test_run_plan(self):
+        workspace = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(workspace, 'plan.jsonl')
+            p = run_tool('objects', 'tasks.yml', 'pkg.yml', 'resolve',
+                         '{reg:{tags:[r1]}}', 'regions_login',
+                         '--output', filename)
+            self.assertEqual(p.returncode, 0)
+            p = run_tool('objects', 'tasks.yml', 'pkg.yml', 'run',
+                         '--plan', filename, '--shard', '1/2')
+            self.assertEqual(p.returncode, 0)
+            p = run_tool('objects.yml', 'tasks.yml', 'pkg.yml', 'run',
+                         '--plan', filename)
+            self.assertNotEqual(p.returncode, 0)
+        finally:
+            shutil.rmtree(workspace)
+
+    def test_run_trace(self):
+        workspace = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(workspace, 'trace.json')
+            p = run_tool('objects', 'tasks.yml', 'pkg.yml', '--trace',
+                         filename, 'run', '{reg:{tags:[r1]}}',
+                         'regions_login')
+            self.assertEqual(p.returncode, 0)
+            with open(filename) as f:
+                names = [e['name'] for e in json.load(f)['traceEvents']]
+            self.assertIn('tool', names)
+            self.assertIn('invoke', names)
+        finally:
+            shutil.rmtree(workspace)
+
+    def test_dump_output_file(self):
+        workspace = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(workspace, 'objects.jsonl')
+            p = run_tool('objects', 'tasks.yml', 'pkg.yml', '-f', 'jsonl',
+                         '--output-file', filename, 'dump')
+            self.assertEqual(p.returncode, 0)
+            with open(filename) as f:
+                items = [json.loads(line) for line in f]
+            self.assertIn('r1', [item['tag'] for item in items])
+        finally:
+            shutil.rmtree(workspace)
+
+    def test_history(self):
+        workspace = tempfile.mkdtemp()
+        try:
+            for _ in range(2):
+                p = run_tool('objects', 'tasks.yml', 'pkg.yml', '-w',
+                             workspace, '--history', 'run',
+                             '{reg:{tags:[r1]}}', 'regions_login')
+                self.assertEqual(p.returncode, 0)
+            filename = os.path.join(workspace, 'history.jsonl')
+            p = run_tool('objects', 'tasks.yml', 'pkg.yml', '-w', workspace,
+                         '-f', 'jsonl', '--output-file', filename, 'history')
+            self.assertEqual(p.returncode, 0)
+            with open(filename) as f:
+                res = json.loads(f.readline())
+            self.assertEqual(res['task'], 'test.Region.login')
+            self.assertEqual(res['count'], 2)
+        finally:
+            shutil.rmtree(workspace)
+
     def test_query_dirs(self):
         p = run_tool('objects', 'tasks.yml', 'pkg.yml', 'query', '{test.Region:{tags:[r1]}}')
         self.assertEqual(p.returncode, 0)
 
+    def test_run_snapshot(self):
+        workspace = tempfile.mkdtemp()
+        try:
+            for _ in range(2):
+                p = run_tool('objects', 'tasks.yml', 'pkg.yml',
+                             '-w', workspace, '--snapshot', 'run',
+                             '{reg:{tags:[r1]}}', 'regions_login')
+                self.assertEqual(p.returncode, 0)
+            self.assertTrue(os.path.isfile(
+                os.path.join(workspace, 'snapshot.pickle')))
+        finally:
+            shutil.rmtree(workspace)
+
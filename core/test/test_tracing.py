@@ -0,0 +1,121 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+from six import StringIO
+from unittest import TestCase
+from pyauto.core import api, taskapi, tracing
+from . import data
+
+
+def get_repository():
+    r = api.Repository()
+    r.load_packages(data.packages)
+    r.load_objects(data.objects)
+    return r
+
+
+class Tracer(TestCase):
+    def setUp(self):
+        self.tracer = tracing.Tracer()
+        self.previous = tracing.set_tracer(self.tracer)
+
+    def tearDown(self):
+        tracing.set_tracer(self.previous)
+
+    def names(self):
+        return [e['name'] for e in self.tracer.iter_events()]
+
+    def test_disabled(self):
+        tracing.set_tracer(None)
+        self.assertIs(tracing.span('x'), tracing.noop)
+        get_repository().invoke('deploy.Region.login', 'abc1', {})
+        self.assertListEqual(self.tracer.events, [])
+
+    def test_nested(self):
+        with tracing.span('outer', a=1):
+            with tracing.span('inner'):
+                pass
+        inner, outer = self.tracer.events
+        self.assertEqual(inner['parent'], outer['id'])
+        self.assertIsNone(outer['parent'])
+        self.assertDictEqual(outer['args'], {'a': 1})
+        self.assertGreaterEqual(outer['dur'], inner['dur'])
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            with tracing.span('fail'):
+                raise ValueError('boom')
+        self.assertEqual(self.tracer.events[0]['args']['error'], 'boom')
+
+    def test_threads(self):
+        def run():
+            with tracing.span('thread'):
+                pass
+        with tracing.span('main'):
+            t = threading.Thread(target=run)
+            t.start()
+            t.join()
+        thread = [e for e in self.tracer.events if e['name'] == 'thread'][0]
+        self.assertIsNone(thread['parent'])
+
+    def test_resolve_invoke(self):
+        repo = get_repository()
+        sequences = taskapi.TaskSequences(data.sequences)
+        list(sequences.run_sequence(repo, data.query, 'deploy_app'))
+        sequences.resolve(repo, data.query, 'deploy_app')
+        names = self.names()
+        self.assertIn('query', names)
+        self.assertIn('render', names)
+        self.assertIn('invoke', names)
+        self.assertIn('resolve', names)
+
+    def test_run_sequence(self):
+        repo = get_repository()
+        sequences = taskapi.TaskSequences(data.sequences)
+        list(sequences.run_sequence(repo, data.query, 'deploy_app'))
+        resolve, = [e for e in self.tracer.events if e['name'] == 'resolve']
+        self.assertEqual(resolve['args']['count'], 39)
+        for event in self.tracer.events:
+            if event['name'] == 'render':
+                self.assertEqual(event['parent'], resolve['id'])
+            elif event['name'] == 'invoke':
+                self.assertNotEqual(event['parent'], resolve['id'])
+
+    def test_detached(self):
+        with tracing.span('outer'):
+            with tracing.detached_span('detached'):
+                with tracing.span('inner'):
+                    pass
+        inner, detached, outer = self.tracer.events
+        self.assertEqual(detached['parent'], outer['id'])
+        self.assertEqual(inner['parent'], outer['id'])
+
+    def test_load_file(self):
+        dirname = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(dirname, 'objects.yml')
+            with open(filename, 'w') as f:
+                f.write(data.example_objects)
+            repo = api.Repository()
+            repo.load_packages(data.packages)
+            repo.load_file(filename)
+        finally:
+            shutil.rmtree(dirname)
+        load_file, load_yaml = [
+            e for e in self.tracer.events
+            if e['name'] in ('load_file', 'load_yaml')][::-1]
+        self.assertEqual(load_yaml['parent'], load_file['id'])
+
+    def test_export(self):
+        with tracing.span('a'):
+            pass
+        f = StringIO()
+        self.tracer.write_chrome(f)
+        trace = json.loads(f.getvalue())
+        self.assertEqual(trace['traceEvents'][0]['ph'], 'X')
+        f = StringIO()
+        self.tracer.write_jsonl(f)
+        lines = f.getvalue().splitlines()
+        self.assertEqual(json.loads(lines[0])['name'], 'a')
@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from pyauto.core import api, uptodate
+
+
+class Copy(api.KindObject):
+    calls = []
+    stamp = 'one'
+
+    def get_path(self):
+        return self.path
+
+    def get_stamp(self):
+        return Copy.stamp
+
+    def copy(self):
+        Copy.calls.append(self.tag)
+        with open(self.source.required.get_path()) as f:
+            data = f.read()
+        with open(self.get_path(), 'w') as f:
+            f.write(data)
+        return self.get_path()
+
+
+copy_packages = """
+package: copy
+version: 0.0.0
+kinds:
+  - kind: File
+    configs: test.test_uptodate.Copy
+    attributes:
+      path: string
+    relations:
+      source: File optional
+    tasks:
+      - copy:
+          inputs: [source.get_path]
+          outputs: [get_path]
+          state: [get_stamp]
+      - get_path
+"""
+
+
+class UpToDate(TestCase):
+    def setUp(self):
+        Copy.calls = []
+        Copy.stamp = 'one'
+        self.dirname = tempfile.mkdtemp()
+        self.src = os.path.join(self.dirname, 'src.txt')
+        self.dst = os.path.join(self.dirname, 'dst.txt')
+        self.write(self.src, 'one')
+        self.repo = api.Repository()
+        self.repo.load_packages([api.yamlutil.load_dict(copy_packages)])
+        self.repo.load_objects([
+            {'kind': 'copy.File', 'tag': 'src', 'path': self.src},
+            {'kind': 'copy.File', 'tag': 'dst', 'path': self.dst,
+             'source': 'src'},
+        ])
+        self.repo.set_fingerprints(uptodate.FingerprintStore(
+            os.path.join(self.dirname, 'ws', 'fingerprints.sqlite')))
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self, filename, data):
+        with open(filename, 'w') as f:
+            f.write(data)
+
+    def copy(self):
+        return self.repo.invoke('copy.File.copy', 'dst', {})
+
+    def test_invalid_option(self):
+        with self.assertRaises(api.InvalidKindObjectTaskException):
+            api.Repository().load_packages([api.yamlutil.load_dict(
+                copy_packages.replace('[get_path]', 'get_path'))])
+
+    def test_resolve_paths(self):
+        obj = self.repo['copy.File/dst']
+        self.assertListEqual(
+            uptodate.resolve_paths(obj, 'source.get_path'), [self.src])
+        self.assertListEqual(
+            uptodate.resolve_paths(self.repo['copy.File/src'],
+                                   'source.get_path'), [])
+
+    def test_skip(self):
+        first = self.copy()
+        second = self.copy()
+        self.assertListEqual(Copy.calls, ['dst'])
+        self.assertNotIn('skipped', first)
+        self.assertEqual(second['skipped'], 'up-to-date')
+        self.assertEqual(second['result'], self.dst)
+
+    def test_input_changed(self):
+        self.copy()
+        self.write(self.src, 'two!')
+        self.copy()
+        self.assertListEqual(Copy.calls, ['dst', 'dst'])
+
+    def test_output_removed(self):
+        self.copy()
+        os.remove(self.dst)
+        self.copy()
+        self.assertListEqual(Copy.calls, ['dst', 'dst'])
+
+    def test_args_changed(self):
+        self.copy()
+        self.repo['copy.File/dst'].data['labels'] = ['changed']
+        self.copy()
+        self.assertListEqual(Copy.calls, ['dst', 'dst'])
+
+    def test_state_changed(self):
+        self.copy()
+        Copy.stamp = 'two'
+        self.copy()
+        self.copy()
+        self.assertListEqual(Copy.calls, ['dst', 'dst'])
+
+    def test_output_directory(self):
+        dirname = os.path.join(self.dirname, 'out')
+        os.mkdir(dirname)
+        before = uptodate.fingerprint_outputs([dirname])
+        self.write(os.path.join(dirname, 'a.txt'), 'a')
+        self.assertNotEqual(uptodate.fingerprint_outputs([dirname]), before)
+        shutil.rmtree(dirname)
+        self.assertListEqual(uptodate.fingerprint_outputs([dirname]),
+                             [[dirname, False, None]])
+
+    def test_no_outputs(self):
+        self.repo.invoke('copy.File.get_path', 'dst', {})
+        self.assertIsNone(self.repo.get_up_to_date_check(
+            self.repo['copy.File'].kind.tasks['get_path'],
+            self.repo['copy.File/dst'], {}))
+
+    def test_disabled(self):
+        self.repo.set_fingerprints(None)
+        self.copy()
+        self.copy()
+        self.assertListEqual(Copy.calls, ['dst', 'dst'])
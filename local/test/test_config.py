@@ -2,7 +2,7 @@ import os
 import shutil
 import six
 from unittest import TestCase
-from pyauto.core import api
+from pyauto.core import api, uptodate
 from pyauto.local import config
 from pyauto.util import yamlutil
 from collections import OrderedDict
@@ -15,6 +15,7 @@ repo.load_file(__file__, 'config.yml')
 
 
 cfg = repo['file.Config/main']
+state = {'value': 'initial'}
 
 
 class Tmp(api.KindObject):
@@ -124,6 +125,22 @@ class File(TestCase):
         f.render_template()
         self.assertTrue(os.path.isfile(f.get_path()))
 
+    def test_render_template_up_to_date(self):
+        repo.set_fingerprints(uptodate.FingerprintStore(
+            cfg.get_path('fingerprints.sqlite')))
+        try:
+            res = [repo.invoke('file.File.render_template',
+                               'myrenderedvarfile', {})
+                   for _ in range(2)]
+            self.assertEqual(res[1].get('skipped'), 'up-to-date')
+            state['value'] = 'changed'
+            res = repo.invoke('file.File.render_template',
+                              'myrenderedvarfile', {})
+            self.assertNotIn('skipped', res)
+        finally:
+            state['value'] = 'initial'
+            repo.set_fingerprints(None)
+
     def test_load_objects(self):
         dir_ = repo['file.File/extraobjects']
         dir_.load_objects()
@@ -192,5 +209,9 @@ class Variable(TestCase):
         self.assertDictEqual(OrderedDict([('abc', 123)]), data)
 
 
+def statefunc():
+    return {'state': state['value']}
+
+
 def varfunc(data):
     return yamlutil.load_dict(data)
@@ -132,6 +132,14 @@ class Command(api.KindObject):
         else:
             return open(name, 'wb')
 
+    def get_input_paths(self):
+        return [os.path.join(self.get_directory(), path)
+                for path in self.get('inputs') or []]
+
+    def get_output_paths(self):
+        return [os.path.join(self.get_directory(), path)
+                for path in self.get('outputs') or []]
+
     def get_directory(self):
         if self.directory:
             return self.directory.required.get_path()
@@ -1,6 +1,20 @@
 import yaml
 from collections import OrderedDict
 
+try:
+    from yaml import CLoader as Loader, CSafeLoader as SafeLoader, \
+        CDumper as Dumper, CSafeDumper as SafeDumper
+    _fallback_loaders = {
+        Loader: yaml.Loader,
+        SafeLoader: yaml.SafeLoader,
+    }
+except ImportError:
+    from yaml import Loader, SafeLoader, Dumper, SafeDumper
+    _fallback_loaders = {}
+
+
+_ordered_loaders = {}
+
 
 def dump_dict(data_dict, **kwargs):
     kwargs['allow_unicode'] = True
@@ -9,22 +23,27 @@ def dump_dict(data_dict, **kwargs):
         kwargs['width'] = 240
     if kwargs.get('safe_dump_all', False):
         del kwargs['safe_dump_all']
-        return yaml.safe_dump_all(data_dict, **kwargs)
+        kwargs.setdefault('Dumper', SafeDumper)
+        return yaml.dump_all(data_dict, **kwargs)
     elif kwargs.get('safe_dump', False):
         del kwargs['safe_dump']
-        return yaml.safe_dump(data_dict, **kwargs)
+        kwargs.setdefault('Dumper', SafeDumper)
+        return yaml.dump(data_dict, **kwargs)
     elif kwargs.get('dump_all', False):
         del kwargs['dump_all']
+        kwargs.setdefault('Dumper', Dumper)
         return yaml.dump_all(data_dict, **kwargs)
     else:
+        kwargs.setdefault('Dumper', Dumper)
         return yaml.dump(data_dict, **kwargs)
 
 
-def load_dict(stream, **kwargs):
-    Loader = kwargs.get('Loader', yaml.Loader)
-    object_pairs_hook = kwargs.get('object_pairs_hook', OrderedDict)
+def get_ordered_loader(loader=Loader, object_pairs_hook=OrderedDict):
+    key = (loader, object_pairs_hook)
+    if key in _ordered_loaders:
+        return _ordered_loaders[key]
 
-    class OrderedLoader(Loader):
+    class OrderedLoader(loader):
         pass
 
     def construct_mapping(loader, node):
@@ -33,17 +52,66 @@ def load_dict(stream, **kwargs):
 
     OrderedLoader.add_constructor(
         yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, construct_mapping)
+    _ordered_loaders[key] = OrderedLoader
+    return OrderedLoader
+
+
+def load_dict(stream, **kwargs):
     if kwargs.get('safe_load_all', False):
-        del kwargs['safe_load_all']
-        return yaml.safe_load_all(stream)
+        return _load_all(stream, SafeLoader, _fallback_loaders.get(SafeLoader))
     elif kwargs.get('safe_load', False):
-        del kwargs['safe_load']
-        return yaml.safe_load(stream)
-    elif kwargs.get('load_all', False):
-        del kwargs['load_all']
-        return yaml.load_all(stream, Loader=OrderedLoader)
+        return _load(stream, SafeLoader, _fallback_loaders.get(SafeLoader))
+    base = kwargs.get('Loader', Loader)
+    object_pairs_hook = kwargs.get('object_pairs_hook', OrderedDict)
+    loader = get_ordered_loader(base, object_pairs_hook)
+    fallback = _fallback_loaders.get(base)
+    if fallback is not None:
+        fallback = get_ordered_loader(fallback, object_pairs_hook)
+    if kwargs.get('load_all', False):
+        return _load_all(stream, loader, fallback)
     else:
-        return yaml.load(stream, OrderedLoader)
+        return _load(stream, loader, fallback)
+
+
+def _get_rewind(stream):
+    if not hasattr(stream, 'read'):
+        return lambda: stream
+    try:
+        position = stream.tell()
+    except Exception:
+        return None
+
+    def rewind():
+        stream.seek(position)
+        return stream
+
+    return rewind
+
+
+def _load(stream, loader, fallback):
+    rewind = _get_rewind(stream) if fallback is not None else None
+    try:
+        return yaml.load(stream, loader)
+    except yaml.YAMLError:
+        if rewind is None:
+            raise
+    return yaml.load(rewind(), fallback)
+
+
+def _load_all(stream, loader, fallback):
+    rewind = _get_rewind(stream) if fallback is not None else None
+    count = 0
+    try:
+        for data in yaml.load_all(stream, loader):
+            count += 1
+            yield data
+        return
+    except yaml.YAMLError:
+        if rewind is None:
+            raise
+    for i, data in enumerate(yaml.load_all(rewind(), fallback)):
+        if i >= count:
+            yield data
 
 
 def _should_use_block(value):
@@ -70,6 +138,6 @@ def _represent_dict_order(self, data):
     return self.represent_mapping('tag:yaml.org,2002:map', data.items())
 
 
-yaml.add_representer(OrderedDict, _represent_dict_order)
-yaml.SafeDumper.add_representer(OrderedDict, _represent_dict_order)
+for _dumper in set([yaml.Dumper, yaml.SafeDumper, Dumper, SafeDumper]):
+    _dumper.add_representer(OrderedDict, _represent_dict_order)
 yaml.representer.BaseRepresenter.represent_scalar = _represent_scalar
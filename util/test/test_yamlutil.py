@@ -1,3 +1,4 @@
+import six
 import yaml
 from unittest import TestCase
 from collections import OrderedDict
@@ -153,3 +154,29 @@ class TestBlockValues(TestCase):
     def test_load_block_value(self):
         res = yaml.safe_load(sample_block_yaml)
         self.assertDictEqual(sample_block_dict, res)
+
+
+class TestOrderedLoader(TestCase):
+    def test_cached(self):
+        loader = yamlutil.get_ordered_loader()
+        self.assertIs(loader, yamlutil.get_ordered_loader())
+        self.assertIsNot(loader, yamlutil.get_ordered_loader(yaml.Loader))
+
+    def test_load_ordered(self):
+        res = yamlutil.load_dict(sample_ordered_yaml)
+        self.assertIsInstance(res, OrderedDict)
+        self.assertListEqual(list(res.keys()), ['q', 'b', 'c', 'h'])
+
+    def test_load_pure_python(self):
+        res = yamlutil.load_dict(sample_ordered_yaml, Loader=yaml.Loader)
+        self.assertEqual(res, sample_ordered_dict)
+
+    def test_load_fallback(self):
+        res = yamlutil.load_dict('{reg:{tags:[r1]}}')
+        self.assertEqual(res, yaml.load('{reg:{tags:[r1]}}', yaml.Loader))
+
+    def test_load_all_fallback(self):
+        stream = six.StringIO('a: 1\n---\n{reg:{tags:[r1]}}\n')
+        res = list(yamlutil.load_dict(stream, load_all=True))
+        self.assertEqual(len(res), 2)
+        self.assertEqual(res[0], {'a': 1})